@@ -1,11 +1,37 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import random
 import string
 import datetime
+import re
+import bisect
+import heapq
+import itertools
+import sys
+import os
+import json
+import time
+import mmap
+import struct
+import csv
+import asyncio
+import threading
+import tempfile
+import queue
+import concurrent.futures
+import urllib.parse
+
+try:
+    import numpy as np
+except ImportError:  # Only the columnar catalog needs NumPy
+    np = None
 
 # Data structure 1: Binary Search Tree for books
 class BookNode:
+    # __slots__ drops the per-node __dict__, BookBST shares author and genre strings through StringPools
+    __slots__ = ("book_id", "title", "author", "genre", "available", "checkout_user", "due_date",
+                 "left", "right", "height", "list_index")
+    
     def __init__(self, book_id, title, author, genre, available=True):
         self.book_id = book_id
         self.title = title
@@ -16,63 +42,452 @@ class BookNode:
         self.due_date = None
         self.left = None
         self.right = None
+        self.height = 1  # Height of the subtree rooted here (used by AVL balancing)
+        self.list_index = -1  # Position in BookBST.books_list
+
+def _node_height(node):
+    return node.height if node is not None else 0
+
+def _update_height(node):
+    node.height = 1 + max(_node_height(node.left), _node_height(node.right))
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update_height(node)
+    _update_height(pivot)
+    return pivot
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update_height(node)
+    _update_height(pivot)
+    return pivot
+
+def _rebalance(node):
+    # AVL rebalancing of a single node, returns the new subtree root
+    _update_height(node)
+    balance = _node_height(node.left) - _node_height(node.right)
+    
+    if balance > 1:
+        if _node_height(node.left.left) < _node_height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    
+    if balance < -1:
+        if _node_height(node.right.right) < _node_height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    
+    return node
+
+def _build_balanced(nodes, lo, hi):
+    # The middle node becomes the root of each range, recursion depth is O(log n)
+    if lo >= hi:
+        return None
+    mid = (lo + hi) // 2
+    node = nodes[mid]
+    node.left = _build_balanced(nodes, lo, mid)
+    node.right = _build_balanced(nodes, mid + 1, hi)
+    _update_height(node)
+    return node
+
+def _merge_by_id(existing, batch):
+    # O(n + k) merge of two ID-sorted node lists, raises ValueError if they share an ID
+    merged = []
+    i, j = 0, 0
+    while i < len(existing) and j < len(batch):
+        if batch[j].book_id < existing[i].book_id:
+            merged.append(batch[j])
+            j += 1
+        elif batch[j].book_id == existing[i].book_id:
+            raise ValueError(f"Duplicate book ID {batch[j].book_id}")
+        else:
+            merged.append(existing[i])
+            i += 1
+    merged.extend(existing[i:])
+    merged.extend(batch[j:])
+    return merged
 
 class BookBST:
-    def __init__(self):
+    def __init__(self, balanced=True):
         self.root = None
+        self.balanced = balanced  # AVL balancing keeps sequential IDs from forming a chain
         self.books_list = []  # For easy traversal
+        self.ids = IdAllocator()  # Next free book ID, survives deletes
+        # Few distinct authors and genres, every node points at one shared copy
+        self.authors = StringPool()
+        self.genres = StringPool()
+        self.columns = None  # Optional ColumnarCatalog, see enable_columns
+        self.backing = None  # Optional MappedCatalog holding books not materialized yet
+        self.backing_removed = set()  # Backing book IDs deleted after materializing
+        self.token_index = TokenIndex()  # Word search over title, author and genre
+        self.trigram_index = TrigramIndex()  # Substring search over title, author and genre
+        # Ordered views for the "Sort by" options, kept up to date on insert and delete
+        self.sort_indexes = {
+            "title": SortedIndex(lambda book: book.title.lower()),
+            "author": SortedIndex(lambda book: book.author.lower()),
+            "genre": SortedIndex(lambda book: book.genre.lower()),
+        }
     
     def insert(self, book_id, title, author, genre):
-        # Best Case O(log n)
-        # Worst Case o(n)
-        if self.root is None:
-            self.root = BookNode(book_id, title, author, genre)
-            self.books_list.append(self.root)
-            return
+        # Balanced: O(log n)
+        # Unbalanced: Best Case O(log n), Worst Case O(n)
+        author = self.authors.intern(author)
+        genre = self.genres.intern(genre)
+        new_node = BookNode(book_id, title, author, genre)
+        self.ids.observe(book_id)
+        new_node.list_index = len(self.books_list)
+        self.books_list.append(new_node)
+        self.token_index.add(book_id, title, author, genre)
+        self.trigram_index.add(book_id, title, author, genre)
+        for index in self.sort_indexes.values():
+            index.insert(new_node)
+        if self.columns is not None:
+            self.columns.append(new_node)
         
-        self._insert_recursive(self.root, book_id, title, author, genre)
-    
-    def _insert_recursive(self, node, book_id, title, author, genre):
-        if book_id < node.book_id:
-            if node.left is None:
-                node.left = BookNode(book_id, title, author, genre)
-                self.books_list.append(node.left)
+        if self.root is None:
+            self.root = new_node
+            return new_node
+        
+        # Walk down iteratively, remembering the path so it can be rebalanced
+        path = []
+        node = self.root
+        while node is not None:
+            path.append(node)
+            if book_id < node.book_id:
+                node = node.left
             else:
-                self._insert_recursive(node.left, book_id, title, author, genre)
+                node = node.right
+        
+        parent = path[-1]
+        if book_id < parent.book_id:
+            parent.left = new_node
         else:
-            if node.right is None:
-                node.right = BookNode(book_id, title, author, genre)
-                self.books_list.append(node.right)
-            else:
-                self._insert_recursive(node.right, book_id, title, author, genre)
+            parent.right = new_node
+        
+        self._fix_path(path)
+        return new_node
     
-    def search(self, book_id):
-        # Best Case O(log n)
-        # Worst Case o(n)
-        return self._search_recursive(self.root, book_id)
+    def bulk_load(self, records):
+        # O(n + k) tree and books_list work for k records already sorted by ID, plus O(k log k) if they are not
+        # Records are (book_id, title, author, genre) with optional (checkout_user, due_date)
+        # Existing books are merged with the batch and the whole tree is rebuilt perfectly balanced
+        # Raises ValueError, before anything changes, if an ID is repeated or already in the tree
+        batch = []
+        loans = []
+        in_order = True
+        for record in records:
+            book_id, title, author, genre = record[:4]
+            node = BookNode(book_id, title, self.authors.intern(author), self.genres.intern(genre))
+            if batch and book_id < batch[-1].book_id:
+                in_order = False
+            batch.append(node)
+            if len(record) > 4 and record[4] is not None:
+                loans.append((node, record[4], record[5]))
+        if not in_order:
+            batch.sort(key=lambda node: node.book_id)
+        for previous, node in zip(batch, batch[1:]):
+            if previous.book_id == node.book_id:
+                raise ValueError(f"Duplicate book ID {node.book_id}")
+        nodes = _merge_by_id(list(self.inorder()), batch) if self.root is not None else batch
+        
+        for node in batch:
+            node.list_index = len(self.books_list)
+            self.books_list.append(node)
+            self.ids.observe(node.book_id)
+            self.token_index.add(node.book_id, node.title, node.author, node.genre)
+            self.trigram_index.add(node.book_id, node.title, node.author, node.genre)
+            if self.columns is not None:
+                self.columns.append(node)
+        for index in self.sort_indexes.values():
+            index.bulk_insert(batch)
+        self.root = _build_balanced(nodes, 0, len(nodes))
+        
+        for node, checkout_user, due_date in loans:
+            self.check_out(node, checkout_user, due_date)
+        return batch
     
-    def _search_recursive(self, node, book_id):
+    def delete(self, book_id):
+        # Balanced: O(log n)
+        # Unbalanced: Best Case O(log n), Worst Case O(n)
+        # A book still only in the backing catalog must be materialized first
+        path = []
+        node = self.root
+        while node is not None and node.book_id != book_id:
+            path.append(node)
+            if book_id < node.book_id:
+                node = node.left
+            else:
+                node = node.right
+        
         if node is None:
             return None
         
-        if node.book_id == book_id:
-            return node
+        parent = path[-1] if path else None
         
-        if book_id < node.book_id:
-            return self._search_recursive(node.left, book_id)
+        if node.left is not None and node.right is not None:
+            # Two children: move the in-order successor node into this position
+            node_index = len(path)
+            path.append(node)
+            successor = node.right
+            while successor.left is not None:
+                path.append(successor)
+                successor = successor.left
+            
+            if path[-1] is node:
+                node.right = successor.right
+            else:
+                path[-1].left = successor.right
+            
+            successor.left = node.left
+            successor.right = node.right
+            successor.height = node.height
+            path[node_index] = successor
+            self._replace_child(parent, node, successor)
         else:
-            return self._search_recursive(node.right, book_id)
+            child = node.left if node.left is not None else node.right
+            self._replace_child(parent, node, child)
+        
+        self._fix_path(path)
+        
+        node.left = None
+        node.right = None
+        node.height = 1
+        
+        self.token_index.remove(node.book_id, node.title, node.author, node.genre)
+        self.trigram_index.remove(node.book_id, node.title, node.author, node.genre)
+        for index in self.sort_indexes.values():
+            index.remove(node)
+        
+        # Swap-remove from books_list so the traversal view stays in sync in O(1)
+        if self.columns is not None:
+            self.columns.remove_row(node.list_index)
+        last = self.books_list.pop()
+        if last is not node:
+            self.books_list[node.list_index] = last
+            last.list_index = node.list_index
+        node.list_index = -1
+        self.ids.release(book_id)
+        if self.backing is not None:
+            self.backing_removed.add(book_id)
+        
+        return node
     
-    def search_by_title(self, title):
-        # O(n)
+    def _replace_child(self, parent, old_child, new_child):
+        if parent is None:
+            self.root = new_child
+        elif parent.left is old_child:
+            parent.left = new_child
+        else:
+            parent.right = new_child
+    
+    def _fix_path(self, path):
+        # Update heights bottom-up along the path and rotate where needed
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            old_height = node.height
+            if not self.balanced:
+                _update_height(node)
+                new_root = node
+            else:
+                new_root = _rebalance(node)
+                if new_root is not node:
+                    self._replace_child(path[i - 1] if i > 0 else None, node, new_root)
+            
+            # Nothing above can change once a subtree keeps its height
+            if new_root.height == old_height:
+                break
+    
+    def search(self, book_id):
+        # Balanced: O(log n)
+        # Unbalanced: Best Case O(log n), Worst Case O(n)
+        node = self.root
+        while node is not None:
+            if node.book_id == book_id:
+                return node
+            
+            if book_id < node.book_id:
+                node = node.left
+            else:
+                node = node.right
+        return None
+    
+    # Mapped catalog: search only sees materialized books and never changes the tree, callers
+    # materialize under the catalog write lock first
+    def attach_catalog(self, catalog):
+        # O(loans log loans), only checked out books are materialized up front so loans can be rebuilt
+        self.backing = catalog
+        self.backing_removed = set()
+        self.ids.observe(catalog.max_book_id)
+        self.bulk_load(catalog.record(row) for row in catalog.loan_rows())
+    
+    def materialize(self, book_id):
+        # O(log n), the node for book_id, read from the backing catalog if it is not in the tree yet
+        node = self.search(book_id)
+        if node is not None or self.backing is None or book_id in self.backing_removed:
+            return node
+        row = self.backing.find(book_id)
+        if row < 0:
+            return None
+        book_id, title, author, genre, checkout_user, due_date = self.backing.record(row)
+        node = self.insert(book_id, title, author, genre)
+        if checkout_user is not None:
+            self.check_out(node, checkout_user, due_date)
+        return node
+    
+    def materialize_all(self, progress=None, step=10000):
+        # O(n), one bulk load of every book still in the catalog, then the catalog is let go
+        # progress(done, total) may raise to stop before anything has changed
+        if self.backing is None:
+            return
+        total = len(self.backing)
+        
+        def rows():
+            for row in range(total):
+                if progress is not None and row % step == 0:
+                    progress(row, total)
+                book_id = self.backing.book_id(row)
+                if book_id not in self.backing_removed and self.search(book_id) is None:
+                    yield self.backing.record(row)
+        
+        self.bulk_load(rows())
+        self.backing.close()
+        self.backing = None
+        self.backing_removed = set()
+    
+    def catalog_records(self):
+        # O(n), (book_id, title, author, genre, checkout_user, due_date) of every book in ID order,
+        # materialized or not
+        nodes = ((book.book_id, book.title, book.author, book.genre, book.checkout_user, book.due_date)
+                 for book in self.inorder())
+        if self.backing is None:
+            return nodes
+        rows = (self.backing.record(row) for row in range(len(self.backing))
+                if self.backing.book_id(row) not in self.backing_removed
+                and self.search(self.backing.book_id(row)) is None)
+        return heapq.merge(nodes, rows, key=lambda record: record[0])
+    
+    def swap_catalog(self, catalog):
+        # A newer file holding every book, the materialized nodes stay as they are
+        self.backing.close()
+        self.backing = catalog
+        self.backing_removed = set()
+    
+    def inorder(self):
+        # O(n), yields books in ID order without recursion
+        return self.id_range(None, None)
+    
+    def id_range(self, low, high):
+        # O(log n + k), yields books with low <= book_id < high in ID order
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            while node is not None:
+                if low is not None and node.book_id < low:
+                    # The whole left subtree is below the range
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            node = stack.pop()
+            if high is not None and node.book_id >= high:
+                return
+            yield node
+            node = node.right
+    
+    def range_books(self, field, low=None, high=None):
+        # O(log n + k), books with low <= key < high for "book_id", "title", "author" or "genre"
+        if field == "book_id":
+            return self.id_range(low, high)
+        if low is not None:
+            low = low.lower()
+        if high is not None:
+            high = high.lower()
+        return self.sort_indexes[field].irange(low, high)
+    
+    def prefix_books(self, field, prefix):
+        # O(log n + k), books whose title, author or genre starts with prefix (case-insensitive)
+        prefix = prefix.lower()
+        return self.sort_indexes[field].irange(prefix, prefix_end(prefix))
+    
+    def sorted_books(self, field):
+        # O(n) walk over a maintained order, no sorting needed
+        if field == "book_id":
+            return self.inorder()
+        return iter(self.sort_indexes[field])
+    
+    def page_books(self, field, start, count):
+        # O(log n + start + count) in ID order, O(n / block size + count) for the other orders
+        if field == "book_id":
+            return list(itertools.islice(self.inorder(), start, start + count))
+        return self.sort_indexes[field].page(start, count)
+    
+    def tree_height(self):
+        # O(1), an AVL tree stays within ~1.44 * log2(n)
+        return _node_height(self.root)
+    
+    def search_terms(self, query):
+        # O(k log n) for k matching books, every word of the query must match
+        book_ids = sorted(self.token_index.query(query))
+        return [self.search(book_id) for book_id in book_ids]
+    
+    def search_text(self, text, fields=("title", "author", "genre"), within=None):
+        # O(k log n) for k candidate books when the text has 3+ characters, O(n) otherwise
+        # Results are in book ID order; books_list order changes on every delete
+        # within: earlier results, in ID order, known to contain every match,
+        # filtered instead when that is less work than the trigram candidates. A candidate costs
+        # a tree lookup and a sort on top of the same check, roughly 8 times a filtered book
+        term = text.lower()
+        estimate = self.trigram_index.estimate(term)
+        if within is not None and (estimate is None or len(within) <= 8 * estimate):
+            candidates = within
+        else:
+            book_ids = self.trigram_index.candidates(term)
+            if book_ids is None:
+                candidates = self.inorder()
+            else:
+                candidates = [self.search(book_id) for book_id in sorted(book_ids)]
+        
         results = []
-        for book in self.books_list:
-            if title.lower() in book.title.lower():
-                results.append(book)
+        for book in candidates:
+            for field in fields:
+                if term in getattr(book, field).lower():
+                    results.append(book)
+                    break
         return results
     
+    def search_by_title(self, title):
+        # O(k log n) for k candidate books, see search_text
+        return self.search_text(title, ("title",))
+    
     def get_all_books(self):
         return self.books_list
+    
+    def check_out(self, book, user_id, due_date):
+        # O(1), every loan change goes through here so the columns stay in sync
+        book.available = False
+        book.checkout_user = user_id
+        book.due_date = due_date
+        if self.columns is not None:
+            self.columns.set_loan(book.list_index, due_date)
+    
+    def check_in(self, book):
+        # O(1)
+        book.available = True
+        book.checkout_user = None
+        book.due_date = None
+        if self.columns is not None:
+            self.columns.set_loan(book.list_index, None)
+    
+    def enable_columns(self):
+        # O(n) once, later inserts, deletes and loans update the columns in O(1)
+        if self.columns is None:
+            self.columns = ColumnarCatalog(self)
+        return self.columns
 
 # Data structure 2: Hash Table for users
 class UserHashTable:
@@ -82,19 +497,28 @@ class UserHashTable:
         self.size = size
         self.table = [[] for _ in range(size)]
         self.num_users = 0
+        self.resizes = 0
+        self.ids = IdAllocator()  # Next free user ID, survives deletes
+        self.indexes = UserIndexes()  # Lookups by email and name prefix
     
     def _hash(self, key):
         return hash(key) % self.size
     
     def insert(self, user_id, name, email):
+        # Raises ValueError if the email belongs to another user
+        self.indexes.check(user_id, email)
         index = self._hash(user_id)
-        for i, (id, _, _) in enumerate(self.table[index]):
+        for i, (id, old_name, old_email) in enumerate(self.table[index]):
             if id == user_id:
+                self.indexes.remove(id, old_name, old_email)
+                self.indexes.add(user_id, name, email)
                 self.table[index][i] = (user_id, name, email)
                 return
     
         self.table[index].append((user_id, name, email))
+        self.indexes.add(user_id, name, email)
         self.num_users += 1
+        self.ids.observe(user_id)
         
         # Resize if load factor exceeds 0.7
         if self.num_users > 0.7 * self.size:
@@ -109,22 +533,48 @@ class UserHashTable:
     
     def remove(self, user_id):
         index = self._hash(user_id)
-        for i, (id, _, _) in enumerate(self.table[index]):
+        for i, (id, name, email) in enumerate(self.table[index]):
             if id == user_id:
                 del self.table[index][i]
                 self.num_users -= 1
+                self.indexes.remove(id, name, email)
+                self.ids.release(user_id)
                 return True
         return False
     
     def _resize(self, new_size):
+        # Entries are moved directly, the email and name indexes do not change
         old_table = self.table
         self.size = new_size
+        self.resizes += 1
         self.table = [[] for _ in range(new_size)]
-        self.num_users = 0
         
         for bucket in old_table:
-            for user_id, name, email in bucket:
-                self.insert(user_id, name, email)
+            for user in bucket:
+                self.table[self._hash(user[0])].append(user)
+    
+    def load_factor(self):
+        return self.num_users / self.size
+    
+    def max_chain(self):
+        # O(size), the longest bucket a lookup may have to walk
+        return max((len(bucket) for bucket in self.table), default=0)
+    
+    def get_by_email(self, email):
+        # O(1), same cost as get
+        user_id = self.indexes.user_for_email(email)
+        return None if user_id is None else self.get(user_id)
+    
+    def search_by_name_prefix(self, prefix):
+        return self.indexes.name_prefix(prefix)
+    
+    def page_by_id(self, start, count):
+        # O(n / block size + count), users at positions [start, start + count) in ID order
+        return self.indexes.ids.page(start, count)
+    
+    def users_by_id(self):
+        # O(n) walk in ID order, no sorting needed
+        return iter(self.indexes.ids)
     
     def get_all_users(self):
         all_users = []
@@ -133,57 +583,1375 @@ class UserHashTable:
                 all_users.append(user)
         return all_users
 
-# Algorithm 1: Quick Sort for book sorting
-def quick_sort_books(books, key_func):
-    # O(n log n) Best Case
-    # O(n**2) Worst Case
-    if len(books) <= 1:
-        return books
+# Data structure 2 (alternative): Open addressing hash table for users
+_TOMBSTONE = object()  # Marks a removed slot so probe chains stay intact
+_FIB_MULT = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+def _fib_slot(key, capacity):
+    # Fibonacci hashing, takes the top bits so sequential IDs spread over the whole table
+    return ((hash(key) * _FIB_MULT) & _MASK64) >> (65 - capacity.bit_length())
+
+class OpenUserHashTable:
+    # Linear probing over parallel key/name/email arrays, no per-user list or tuple
+    # Insert/Get/Remove: Best Case O(1), Worst Case O(n)
+    # Resizing is incremental, each insert or remove moves a few old slots into the new arrays
+    # Lookups never move entries, so get is read-only like in UserHashTable
+    MAX_LOAD = 0.7
+    MIGRATE_STEP = 4  # At least 2, so a resize finishes before the new arrays fill up
+    
+    def __init__(self, size=128):
+        capacity = 8
+        while capacity < size:
+            capacity *= 2
+        self.size = capacity
+        self.keys = [None] * capacity
+        self.names = [None] * capacity
+        self.emails = [None] * capacity
+        self.num_users = 0
+        self.resizes = 0
+        self.used = 0  # Live plus tombstone slots in the current arrays
+        self.old = None  # (keys, names, emails) still being drained after a resize
+        self.migrate_pos = 0
+        self.ids = IdAllocator()  # Next free user ID, survives deletes
+        self.indexes = UserIndexes()  # Lookups by email and name prefix
+    
+    def _arrays(self):
+        # The current arrays, then the ones being drained
+        yield self.keys, self.names, self.emails
+        if self.old is not None:
+            yield self.old
+    
+    @staticmethod
+    def _find(keys, key):
+        # Slot holding key, or -1
+        mask = len(keys) - 1
+        i = _fib_slot(key, len(keys))
+        while True:
+            slot_key = keys[i]
+            if slot_key is None:
+                return -1
+            if slot_key is not _TOMBSTONE and slot_key == key:
+                return i
+            i = (i + 1) & mask
     
-    pivot = books[len(books) // 2]
-    pivot_key = key_func(pivot)
+    def _place(self, key, name, email):
+        # Store a key known to be absent from the current arrays
+        keys = self.keys
+        mask = self.size - 1
+        i = _fib_slot(key, self.size)
+        while keys[i] is not None and keys[i] is not _TOMBSTONE:
+            i = (i + 1) & mask
+        if keys[i] is None:
+            self.used += 1
+        keys[i] = key
+        self.names[i] = name
+        self.emails[i] = email
     
-    left = [book for book in books if key_func(book) < pivot_key]
-    middle = [book for book in books if key_func(book) == pivot_key]
-    right = [book for book in books if key_func(book) > pivot_key]
+    def _migrate(self, steps):
+        # Move up to `steps` old slots into the current arrays
+        old_keys, old_names, old_emails = self.old
+        pos = self.migrate_pos
+        end = min(pos + steps, len(old_keys))
+        place = self._place
+        while pos < end:
+            key = old_keys[pos]
+            if key is not None and key is not _TOMBSTONE:
+                place(key, old_names[pos], old_emails[pos])
+                # Keep the probe chain intact, but never find the moved copy again
+                old_keys[pos] = _TOMBSTONE
+            pos += 1
+        self.migrate_pos = pos
+        if pos == len(old_keys):
+            self.old = None
+            self.migrate_pos = 0
     
-    return quick_sort_books(left, key_func) + middle + quick_sort_books(right, key_func)
+    def insert(self, user_id, name, email):
+        # Raises ValueError if the email belongs to another user
+        self.indexes.check(user_id, email)
+        if self.old is not None:
+            self._migrate(self.MIGRATE_STEP)
+        
+        i = self._find(self.keys, user_id)
+        if i >= 0:
+            self.indexes.remove(user_id, self.names[i], self.emails[i])
+            self.indexes.add(user_id, name, email)
+            self.names[i] = name
+            self.emails[i] = email
+            return
+        
+        if self.old is not None:
+            old_keys, old_names, old_emails = self.old
+            j = self._find(old_keys, user_id)
+            if j >= 0:
+                # Not migrated yet, the update goes straight into the current arrays
+                self.indexes.remove(user_id, old_names[j], old_emails[j])
+                old_keys[j] = _TOMBSTONE
+                self.num_users -= 1
+        
+        if self.used + 1 > self.MAX_LOAD * self.size:
+            # Grow when mostly live, otherwise rebuild at the same size to drop tombstones
+            if 2 * (self.num_users + 1) > self.MAX_LOAD * self.size:
+                self._resize(self.size * 2)
+            else:
+                self._resize(self.size)
+        
+        self._place(user_id, name, email)
+        self.num_users += 1
+        self.ids.observe(user_id)
+        self.indexes.add(user_id, name, email)
+    
+    def get(self, user_id):
+        for keys, names, emails in self._arrays():
+            i = self._find(keys, user_id)
+            if i >= 0:
+                return (user_id, names[i], emails[i])
+        return None
+    
+    def remove(self, user_id):
+        if self.old is not None:
+            self._migrate(self.MIGRATE_STEP)
+        
+        for keys, names, emails in self._arrays():
+            i = self._find(keys, user_id)
+            if i >= 0:
+                self.indexes.remove(user_id, names[i], emails[i])
+                keys[i] = _TOMBSTONE
+                names[i] = None
+                emails[i] = None
+                self.num_users -= 1
+                self.ids.release(user_id)
+                return True
+        return False
+    
+    def _resize(self, new_size):
+        # O(1) here, the entries are moved by later operations
+        if self.old is not None:
+            self._migrate(len(self.old[0]))
+        
+        self.old = (self.keys, self.names, self.emails)
+        self.migrate_pos = 0
+        self.size = new_size
+        self.resizes += 1
+        self.keys = [None] * new_size
+        self.names = [None] * new_size
+        self.emails = [None] * new_size
+        self.used = 0
+    
+    def get_by_email(self, email):
+        # O(1), same cost as get
+        user_id = self.indexes.user_for_email(email)
+        return None if user_id is None else self.get(user_id)
+    
+    def search_by_name_prefix(self, prefix):
+        return self.indexes.name_prefix(prefix)
+    
+    def page_by_id(self, start, count):
+        # O(n / block size + count), users at positions [start, start + count) in ID order
+        return self.indexes.ids.page(start, count)
+    
+    def users_by_id(self):
+        # O(n) walk in ID order, no sorting needed
+        return iter(self.indexes.ids)
+    
+    def get_all_users(self):
+        all_users = []
+        for keys, names, emails in self._arrays():
+            for i, key in enumerate(keys):
+                if key is not None and key is not _TOMBSTONE:
+                    all_users.append((key, names[i], emails[i]))
+        return all_users
+    
+    def load_factor(self):
+        return self.num_users / self.size
+    
+    def max_chain(self):
+        # O(size), the longest probe sequence a lookup in the current arrays walks, in slots
+        mask = self.size - 1
+        longest = 0
+        for i, key in enumerate(self.keys):
+            if key is not None and key is not _TOMBSTONE:
+                longest = max(longest, ((i - _fib_slot(key, self.size)) & mask) + 1)
+        return longest
+
+# Data structure 3: Inverted index for word search
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class TokenIndex:
+    # Maps each normalized token to the set of book IDs containing it
+    def __init__(self):
+        self.postings = {}
+    
+    def add(self, book_id, *texts):
+        # O(number of tokens)
+        for text in texts:
+            for token in tokenize(text):
+                posting = self.postings.get(token)
+                if posting is None:
+                    self.postings[token] = {book_id}
+                else:
+                    posting.add(book_id)
+    
+    def remove(self, book_id, *texts):
+        # O(number of tokens)
+        for text in texts:
+            for token in tokenize(text):
+                posting = self.postings.get(token)
+                if posting is not None:
+                    posting.discard(book_id)
+                    if not posting:
+                        del self.postings[token]
+    
+    def query(self, text):
+        # O(size of the smallest posting list * number of terms)
+        tokens = set(tokenize(text))
+        if not tokens:
+            return set()
+        return _intersect_postings(self.postings, tokens)
+
+def _intersect_postings(postings, keys):
+    # Intersect starting from the shortest list so the work tracks the result size
+    lists = []
+    for key in keys:
+        posting = postings.get(key)
+        if not posting:
+            return set()
+        lists.append(posting)
+    
+    lists.sort(key=len)
+    result = set(lists[0])
+    for posting in lists[1:]:
+        result &= posting
+        if not result:
+            break
+    return result
+
+# Data structure 4: Trigram index for substring search
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    # Maps every 3-character substring of the lowercased fields to the set of book IDs containing it
+    def __init__(self):
+        self.postings = {}
+    
+    def _book_trigrams(self, texts):
+        grams = set()
+        for text in texts:
+            grams |= trigrams(text.lower())
+        return grams
+    
+    def add(self, book_id, *texts):
+        # O(total text length)
+        for gram in self._book_trigrams(texts):
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = {book_id}
+            else:
+                posting.add(book_id)
+    
+    def remove(self, book_id, *texts):
+        # O(total text length)
+        for gram in self._book_trigrams(texts):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(book_id)
+                if not posting:
+                    del self.postings[gram]
+    
+    def candidates(self, text):
+        # Superset of the books containing text, or None when text is shorter than 3 characters
+        grams = trigrams(text.lower())
+        if not grams:
+            return None
+        return _intersect_postings(self.postings, grams)
+    
+    def estimate(self, text):
+        # O(len(text)), upper bound on len(candidates(text)) without computing it, None like candidates
+        grams = trigrams(text.lower())
+        if not grams:
+            return None
+        return min(len(self.postings.get(gram, ())) for gram in grams)
+
+# Data structure 5: Sorted index for ordered views of the books
+class SortedIndex:
+    # A sorted list split into blocks, so an insert or delete only shifts one small block
+    # Insert/Remove O(log n + block size), full walk O(n), page walk O(n / block size + k)
+    BLOCK_SIZE = 512
+    
+    def __init__(self, key_func, id_func=None):
+        self.key_func = key_func
+        self.id_func = id_func  # Tie-breaking ID of a record, book.book_id when None
+        self.blocks = []  # Sorted lists of (key, book_id, book)
+        self.maxes = []   # (key, book_id) of the last entry in each block
+        self.count = 0
+    
+    def _probe(self, book):
+        if self.id_func is None:
+            return (self.key_func(book), book.book_id)
+        return (self.key_func(book), self.id_func(book))
+    
+    def insert(self, book):
+        probe = self._probe(book)
+        entry = probe + (book,)
+        self.count += 1
+        
+        if not self.blocks:
+            self.blocks.append([entry])
+            self.maxes.append(probe)
+            return
+        
+        # Probes are (key, book_id) pairs so BookNodes are never compared
+        i = bisect.bisect_left(self.maxes, probe)
+        if i == len(self.blocks):
+            i -= 1
+        block = self.blocks[i]
+        block.insert(bisect.bisect_left(block, probe), entry)
+        self.maxes[i] = block[-1][:2]
+        
+        if len(block) > 2 * self.BLOCK_SIZE:
+            half = len(block) // 2
+            self.blocks[i:i + 1] = [block[:half], block[half:]]
+            self.maxes[i:i + 1] = [block[half - 1][:2], block[-1][:2]]
+    
+    def bulk_insert(self, books):
+        # O(k log k) into an empty index, otherwise one insert per book
+        if self.count:
+            for book in books:
+                self.insert(book)
+            return
+        
+        entries = [self._probe(book) + (book,) for book in books]
+        entries.sort(key=lambda entry: entry[:2])
+        self.blocks = [entries[i:i + self.BLOCK_SIZE] for i in range(0, len(entries), self.BLOCK_SIZE)]
+        self.maxes = [block[-1][:2] for block in self.blocks]
+        self.count = len(entries)
+    
+    def remove(self, book):
+        probe = self._probe(book)
+        i = bisect.bisect_left(self.maxes, probe)
+        if i == len(self.blocks):
+            return False
+        
+        block = self.blocks[i]
+        j = bisect.bisect_left(block, probe)
+        while j < len(block) and block[j][:2] == probe:
+            # Identity for BookNodes, value equality for plain records such as user tuples
+            if block[j][2] == book:
+                del block[j]
+                self.count -= 1
+                if block:
+                    self.maxes[i] = block[-1][:2]
+                else:
+                    del self.blocks[i]
+                    del self.maxes[i]
+                return True
+            j += 1
+        return False
+    
+    def page(self, start, count):
+        # O(n / block size + k), the books at sorted positions [start, start + count)
+        results = []
+        for block in self.blocks:
+            if start >= len(block):
+                start -= len(block)
+                continue
+            for entry in block[start:start + count - len(results)]:
+                results.append(entry[2])
+            start = 0
+            if len(results) >= count:
+                break
+        return results
+    
+    def irange(self, low=None, high=None):
+        # O(log n + k), yields books with low <= key < high, either bound may be None
+        i, j = 0, 0
+        if low is not None:
+            # (low,) sorts before every (low, book_id) entry
+            probe = (low,)
+            i = bisect.bisect_left(self.maxes, probe)
+            if i == len(self.blocks):
+                return
+            j = bisect.bisect_left(self.blocks[i], probe)
+        
+        while i < len(self.blocks):
+            block = self.blocks[i]
+            while j < len(block):
+                entry = block[j]
+                if high is not None and entry[0] >= high:
+                    return
+                yield entry[2]
+                j += 1
+            i += 1
+            j = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        for block in self.blocks:
+            for entry in block:
+                yield entry[2]
+
+# Data structure 6: Loan index for checked out books
+class LoanIndex:
+    # Who has which book, so loan lookups cost O(loans) instead of O(catalog)
+    def __init__(self):
+        self.user_books = {}  # user_id -> set of checked out book IDs
+        self.checked_out = set()
+    
+    def add(self, book_id, user_id):
+        # O(1)
+        self.checked_out.add(book_id)
+        books = self.user_books.get(user_id)
+        if books is None:
+            self.user_books[user_id] = {book_id}
+        else:
+            books.add(book_id)
+    
+    def remove(self, book_id, user_id):
+        # O(1)
+        self.checked_out.discard(book_id)
+        books = self.user_books.get(user_id)
+        if books is not None:
+            books.discard(book_id)
+            if not books:
+                del self.user_books[user_id]
+    
+    def books_for_user(self, user_id):
+        return self.user_books.get(user_id, set())
+    
+    def has_loans(self, user_id):
+        return user_id in self.user_books
+    
+    def __len__(self):
+        return len(self.checked_out)
+
+# Data structure 7: Min-heap of due dates for overdue detection
+class DueDateQueue:
+    # Returned books are deleted lazily, their stale heap entries are skipped and compacted away
+    def __init__(self):
+        self.heap = []  # (due_date, book_id, user_id, loan number)
+        self.live = {}  # book_id -> loan number of the current loan
+        self.loan_numbers = itertools.count()
+    
+    def push(self, book_id, user_id, due_date):
+        # O(log n), every loan gets a new number, so an entry left over from an earlier loan
+        # with the same due date and user is still recognized as stale
+        loan = next(self.loan_numbers)
+        self.live[book_id] = loan
+        heapq.heappush(self.heap, (due_date, book_id, user_id, loan))
+    
+    def remove(self, book_id):
+        # O(1) amortized, the heap is rebuilt once most of it is stale
+        self.live.pop(book_id, None)
+        if len(self.heap) > 2 * len(self.live) + 64:
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
+    
+    def _is_live(self, entry):
+        return self.live.get(entry[1]) == entry[3]
+    
+    def peek(self):
+        # O(log n) amortized, the loan due soonest as (due_date, book_id, user_id)
+        while self.heap and not self._is_live(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][:3] if self.heap else None
+    
+    def due_before(self, when):
+        # O(k log k) for k loans due before when, subtrees of the heap that start later are skipped
+        results = []
+        stack = [0] if self.heap else []
+        while stack:
+            i = stack.pop()
+            entry = self.heap[i]
+            if entry[0] >= when:
+                continue
+            if self._is_live(entry):
+                results.append(entry[:3])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    stack.append(child)
+        results.sort()
+        return results
+    
+    def next_due(self, n):
+        # O(n log n), the n loans due soonest without popping them
+        results = []
+        frontier = [(self.heap[0], 0)] if self.heap else []
+        while frontier and len(results) < n:
+            entry, i = heapq.heappop(frontier)
+            if self._is_live(entry):
+                results.append(entry[:3])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    heapq.heappush(frontier, (self.heap[child], child))
+        return results
+    
+    def __len__(self):
+        return len(self.live)
+
+# Data structure 8: ID allocator for books and users
+class IdAllocator:
+    # Hands out IDs above the highest one ever seen, so deleting the newest record never reissues its ID
+    # Allocate/Observe/Release: O(1), O(log n) when freed IDs are reused
+    def __init__(self, reuse_freed=False):
+        self.high_water = 0  # Highest ID ever used or reserved
+        self.reuse_freed = reuse_freed
+        self.freed = []  # Min-heap of released IDs, only kept when reuse_freed is set
+        self.freed_set = set()
+    
+    def observe(self, record_id):
+        # Called for every ID that gets stored, whoever picked it
+        if record_id > self.high_water:
+            self.high_water = record_id
+        # A reused ID stays in the heap and is skipped once popped
+        self.freed_set.discard(record_id)
+    
+    def release(self, record_id):
+        if self.reuse_freed and record_id not in self.freed_set:
+            self.freed_set.add(record_id)
+            heapq.heappush(self.freed, record_id)
+    
+    def allocate(self):
+        # Smallest freed ID when reuse is on, otherwise high water mark + 1
+        while self.freed:
+            record_id = heapq.heappop(self.freed)
+            if record_id in self.freed_set:
+                self.freed_set.discard(record_id)
+                return record_id
+        self.high_water += 1
+        return self.high_water
+    
+    def reserve(self, count):
+        # O(1), a contiguous block of fresh IDs for bulk imports
+        start = self.high_water + 1
+        self.high_water += count
+        return range(start, start + count)
+
+# Data structure 9: Secondary indexes for users
+def normalize_email(email):
+    return email.strip().lower()
+
+class UserIndexes:
+    # Unique normalized email -> user_id, plus users in name order for prefix search
+    # and in ID order for paging
+    def __init__(self):
+        self.emails = {}
+        self.names = SortedIndex(lambda user: user[1].lower(), lambda user: user[0])
+        self.ids = SortedIndex(lambda user: user[0], lambda user: user[0])
+    
+    def check(self, user_id, email):
+        # O(1), raises ValueError when another user already has this email
+        owner = self.emails.get(normalize_email(email))
+        if owner is not None and owner != user_id:
+            raise ValueError(f"Email '{email}' is already registered to user {owner}")
+    
+    def add(self, user_id, name, email):
+        # O(log n + block size)
+        self.emails[normalize_email(email)] = user_id
+        user = (user_id, name, email)
+        self.names.insert(user)
+        self.ids.insert(user)
+    
+    def remove(self, user_id, name, email):
+        # O(log n + block size)
+        key = normalize_email(email)
+        if self.emails.get(key) == user_id:
+            del self.emails[key]
+        user = (user_id, name, email)
+        self.names.remove(user)
+        self.ids.remove(user)
+    
+    def user_for_email(self, email):
+        return self.emails.get(normalize_email(email))
+    
+    def name_prefix(self, prefix):
+        # O(log n + k), (user_id, name, email) of users whose name starts with prefix (case-insensitive)
+        prefix = prefix.lower()
+        return list(self.names.irange(prefix, prefix_end(prefix)))
+
+# Data structure 10: String pool for repeated book fields
+class StringPool:
+    # Dictionary encoding: each distinct value is stored once and gets a small integer code
+    def __init__(self):
+        self.codes = {}  # value -> code
+        self.values = []  # code -> value
+    
+    def intern(self, value):
+        # O(1), the shared copy of value
+        code = self.codes.get(value)
+        if code is None:
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+            return value
+        return self.values[code]
+    
+    def code(self, value):
+        # O(1), None for values never interned
+        return self.codes.get(value)
+    
+    def __len__(self):
+        return len(self.values)
+
+# Data structure 11: Columnar view of the catalog for vectorized filters
+class ColumnarCatalog:
+    # NumPy columns where row i is BookBST.books_list[i], so selected rows map straight back to BookNodes
+    # Filters and counts are vectorized boolean masks: O(n) but in C, milliseconds for millions of rows
+    def __init__(self, books):
+        if np is None:
+            raise ImportError("ColumnarCatalog requires NumPy")
+        self.books = books
+        self.count = 0
+        capacity = max(16, len(books.books_list))
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.genre_codes = np.zeros(capacity, dtype=np.int32)
+        self.author_codes = np.zeros(capacity, dtype=np.int32)
+        self.available = np.zeros(capacity, dtype=bool)
+        self.due_dates = np.full(capacity, np.datetime64("NaT"), dtype="datetime64[s]")
+        for book in books.books_list:
+            self.append(book)
+    
+    def _grow(self):
+        # Amortized O(1) per append, capacity doubles
+        capacity = 2 * len(self.ids)
+        for name in ("ids", "genre_codes", "author_codes", "available", "due_dates"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+    
+    def append(self, book):
+        # O(1) amortized, the row index equals book.list_index
+        if self.count == len(self.ids):
+            self._grow()
+        row = self.count
+        self.ids[row] = book.book_id
+        self.genre_codes[row] = self.books.genres.code(book.genre)
+        self.author_codes[row] = self.books.authors.code(book.author)
+        self.count += 1
+        self.set_loan(row, None if book.available else book.due_date)
+    
+    def remove_row(self, row):
+        # O(1), mirrors the swap-remove done on books_list
+        last = self.count - 1
+        if row != last:
+            for column in (self.ids, self.genre_codes, self.author_codes, self.available, self.due_dates):
+                column[row] = column[last]
+        self.count = last
+    
+    def set_loan(self, row, due_date):
+        # due_date None marks the book as available
+        self.available[row] = due_date is None
+        self.due_dates[row] = np.datetime64("NaT") if due_date is None else np.datetime64(due_date, "s")
+    
+    def mask(self, genre=None, author=None, available=None):
+        # Boolean mask over the live rows, every given condition must hold
+        n = self.count
+        result = np.ones(n, dtype=bool)
+        for pool, codes, value in ((self.books.genres, self.genre_codes, genre),
+                                   (self.books.authors, self.author_codes, author)):
+            if value is None:
+                continue
+            code = pool.code(value)
+            if code is None:
+                return np.zeros(n, dtype=bool)
+            result &= codes[:n] == code
+        if available is not None:
+            result &= self.available[:n] == available
+        return result
+    
+    def overdue_mask(self, now):
+        # NaT never compares as earlier, so books that are not checked out drop out
+        return self.due_dates[:self.count] < np.datetime64(now, "s")
+    
+    def rows_to_books(self, mask):
+        books_list = self.books.books_list
+        return [books_list[row] for row in np.flatnonzero(mask)]
+    
+    def filter(self, genre=None, author=None, available=None):
+        # Matching BookNodes in books_list order
+        return self.rows_to_books(self.mask(genre, author, available))
+    
+    def count_matching(self, genre=None, author=None, available=None):
+        return int(np.count_nonzero(self.mask(genre, author, available)))
+    
+    def overdue(self, now):
+        return self.rows_to_books(self.overdue_mask(now))
+    
+    def genre_counts(self, mask=None):
+        # Facet counts per genre, optionally within a mask
+        codes = self.genre_codes[:self.count]
+        if mask is not None:
+            codes = codes[mask]
+        counts = np.bincount(codes, minlength=len(self.books.genres))
+        return {genre: int(counts[code]) for code, genre in enumerate(self.books.genres.values) if counts[code]}
+    
+    def __len__(self):
+        return self.count
+
+# Data structure 12: Memory-mapped binary catalog
+# Layout, little endian:
+#   header    magic, version, book count, loan count, max book ID, section offsets
+#   records   one fixed-size record per book, sorted by book ID
+#   loans     row numbers of checked out books
+#   heap      UTF-8 string bytes, each distinct author and genre stored once
+_CATALOG_MAGIC = b"LMSCAT01"
+_CATALOG_HEADER = struct.Struct("<8sIQQqQQQ")
+# book_id, title (offset, length), author (offset, length), genre (offset, length), checkout_user,
+# due date in microseconds since 1970-01-01 (naive, like the due dates themselves)
+_CATALOG_RECORD = struct.Struct("<qQIQIQIqq")
+_CATALOG_LOAN = struct.Struct("<Q")
+_CATALOG_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_NO_VALUE = -1  # checkout_user / due date of an available book
+
+def write_catalog_file(path, records, max_book_id):
+    # O(n) for (book_id, title, author, genre, checkout_user, due_date) records in ID order,
+    # written to a temp file and renamed so readers never see a partial catalog
+    heap = bytearray()
+    heap_offsets = {}  # Shared strings are written once
+    
+    def heap_add(text, shared):
+        if shared and text in heap_offsets:
+            return heap_offsets[text]
+        data = text.encode("utf-8")
+        entry = (len(heap), len(data))
+        heap.extend(data)
+        if shared:
+            heap_offsets[text] = entry
+        return entry
+    
+    body = bytearray()
+    loans = bytearray()
+    count = 0
+    for book_id, title, author, genre, checkout_user, due_date in records:
+        title = heap_add(title, False)
+        author = heap_add(author, True)
+        genre = heap_add(genre, True)
+        if checkout_user is None:
+            checkout_user, due = _NO_VALUE, _NO_VALUE
+        else:
+            loans.extend(_CATALOG_LOAN.pack(count))
+            due = (due_date - _CATALOG_EPOCH) // _MICROSECOND
+        body.extend(_CATALOG_RECORD.pack(book_id, *title, *author, *genre, checkout_user, due))
+        count += 1
+    
+    records_offset = _CATALOG_HEADER.size
+    loans_offset = records_offset + len(body)
+    heap_offset = loans_offset + len(loans)
+    header = _CATALOG_HEADER.pack(_CATALOG_MAGIC, 1, count, len(loans) // _CATALOG_LOAN.size,
+                                  max_book_id, records_offset, loans_offset, heap_offset)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.write(loans)
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+class MappedCatalog:
+    # Read-only view of a catalog file, opening it is O(1) whatever its size
+    # The mapping is shared through the page cache, so several processes can open the same file
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{path} is not a library catalog file")
+        (magic, version, self.count, self.loan_count, self.max_book_id,
+         self.records_offset, self.loans_offset, self.heap_offset) = _CATALOG_HEADER.unpack_from(self.map, 0)
+        if magic != _CATALOG_MAGIC or version != 1:
+            self.close()
+            raise ValueError(f"{path} is not a library catalog file")
+    
+    def book_id(self, row):
+        # O(1), reads 8 bytes
+        return struct.unpack_from("<q", self.map, self.records_offset + row * _CATALOG_RECORD.size)[0]
+    
+    def find(self, book_id):
+        # O(log n), row of book_id or -1, binary search over the sorted records
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.book_id(mid) < book_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.book_id(lo) == book_id:
+            return lo
+        return -1
+    
+    def _text(self, offset, length):
+        start = self.heap_offset + offset
+        return self.map[start:start + length].decode("utf-8")
+    
+    def record(self, row):
+        # O(1), (book_id, title, author, genre, checkout_user, due_date)
+        (book_id, title_offset, title_length, author_offset, author_length, genre_offset, genre_length,
+         checkout_user, due) = _CATALOG_RECORD.unpack_from(self.map, self.records_offset + row * _CATALOG_RECORD.size)
+        if checkout_user == _NO_VALUE:
+            checkout_user, due_date = None, None
+        else:
+            due_date = _CATALOG_EPOCH + due * _MICROSECOND
+        return (book_id, self._text(title_offset, title_length), self._text(author_offset, author_length),
+                self._text(genre_offset, genre_length), checkout_user, due_date)
+    
+    def loan_rows(self):
+        # O(loans), rows of the checked out books
+        for i in range(self.loan_count):
+            yield _CATALOG_LOAN.unpack_from(self.map, self.loans_offset + i * _CATALOG_LOAN.size)[0]
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+# Data structure 13: LRU cache of search results
+class QueryCache:
+    # Recent queries and their results, least recently used first (dicts keep insertion order)
+    # Every book containing "harr" also contains "har", so a longer query is answered by
+    # filtering the closest cached result instead of searching the whole catalog again
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.entries = {}  # query -> results
+        self.lock = threading.Lock()
+    
+    def lookup(self, query):
+        # O(capacity), (cached query, results) for query itself or the longest cached query
+        # it contains, (None, None) when nothing applies
+        with self.lock:
+            if query in self.entries:
+                results = self.entries.pop(query)
+                self.entries[query] = results
+                return query, results
+            best = None
+            for cached in self.entries:
+                if cached in query and (best is None or len(cached) > len(best)):
+                    best = cached
+            if best is None:
+                return None, None
+            return best, self.entries[best]
+    
+    def put(self, query, results):
+        # O(1), evicts the least recently used query when full
+        with self.lock:
+            self.entries.pop(query, None)
+            self.entries[query] = results
+            if len(self.entries) > self.capacity:
+                del self.entries[next(iter(self.entries))]
+    
+    def clear(self):
+        # Called on every change to the catalog text, cached results would miss or keep books
+        with self.lock:
+            self.entries.clear()
+    
+    def __len__(self):
+        return len(self.entries)
+
+# Algorithm 1: Merge Sort for book sorting
+def merge_sort_books(books, key_func):
+    # O(n log n) Best and Worst Case, stable, no recursion
+    # Each key is computed once, then positions are merged between two index buffers
+    n = len(books)
+    keys = [key_func(book) for book in books]
+    order = list(range(n))
+    buffer = [0] * n
+    
+    # Insertion sort short runs first, it is cheaper than merging tiny lists
+    run = 32
+    for start in range(0, n, run):
+        end = min(start + run, n)
+        for i in range(start + 1, end):
+            item = order[i]
+            key = keys[item]
+            j = i - 1
+            while j >= start and keys[order[j]] > key:
+                order[j + 1] = order[j]
+                j -= 1
+            order[j + 1] = item
+    
+    # Bottom-up merging of neighbouring runs
+    width = run
+    while width < n:
+        for left in range(0, n, 2 * width):
+            mid = min(left + width, n)
+            right = min(left + 2 * width, n)
+            
+            # Already in order (common for equal keys), just copy
+            if mid >= right or not keys[order[mid]] < keys[order[mid - 1]]:
+                buffer[left:right] = order[left:right]
+                continue
+            
+            i, j, k = left, mid, left
+            while i < mid and j < right:
+                # Take from the left run on ties to keep the sort stable
+                if keys[order[j]] < keys[order[i]]:
+                    buffer[k] = order[j]
+                    j += 1
+                else:
+                    buffer[k] = order[i]
+                    i += 1
+                k += 1
+            buffer[k:k + mid - i] = order[i:mid]
+            k += mid - i
+            buffer[k:right] = order[j:right]
+        
+        order, buffer = buffer, order
+        width *= 2
+    
+    return [books[i] for i in order]
+
+def quick_sort_books(books, key_func):
+    # Kept for existing callers, sorting is done by merge_sort_books
+    # O(n log n) Best and Worst Case
+    return merge_sort_books(books, key_func)
 
 # Algorithm 2: Binary Search for finding books
+def lower_bound(sorted_books, target, key_func, lo=0, hi=None):
+    # O(log n), first position whose key is >= target
+    if hi is None:
+        hi = len(sorted_books)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key_func(sorted_books[mid]) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def upper_bound(sorted_books, target, key_func, lo=0, hi=None):
+    # O(log n), first position whose key is > target
+    if hi is None:
+        hi = len(sorted_books)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if target < key_func(sorted_books[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+def prefix_end(prefix):
+    # Smallest string greater than every string starting with prefix, None if there is none
+    while prefix and ord(prefix[-1]) == sys.maxunicode:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class BookRange:
+    # Lazy view of sorted_books[start:stop], nothing is copied
+    def __init__(self, sorted_books, start, stop):
+        self.sorted_books = sorted_books
+        self.start = start
+        self.stop = max(start, stop)
+    
+    def __len__(self):
+        return self.stop - self.start
+    
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self.sorted_books[i]
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("BookRange only supports contiguous slices")
+            return BookRange(self.sorted_books, self.start + start, self.start + stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("BookRange index out of range")
+        return self.sorted_books[self.start + index]
+
+def range_search_books(sorted_books, low, high, key_func):
+    # O(log n), books with low <= key < high, either bound may be None
+    start = 0 if low is None else lower_bound(sorted_books, low, key_func)
+    stop = len(sorted_books) if high is None else lower_bound(sorted_books, high, key_func, start)
+    return BookRange(sorted_books, start, stop)
+
+def prefix_search_books(sorted_books, prefix, key_func):
+    # O(log n), books whose (string) key starts with prefix
+    return range_search_books(sorted_books, prefix, prefix_end(prefix), key_func)
+
 def binary_search_books(sorted_books, target, key_func):
-    # Best Case O(log n)
-    # Worst Case O(n)
-    if not sorted_books:
-        return []
-    
-    left, right = 0, len(sorted_books) - 1
-    
-    # Find leftmost occurrence
-    first_occurrence = -1
-    while left <= right:
-        mid = (left + right) // 2
-        mid_key = key_func(sorted_books[mid])
-        
-        if mid_key == target:
-            first_occurrence = mid
-            right = mid - 1
-        elif mid_key < target:
-            left = mid + 1
+    # O(log n + k) for k matching books, two binary searches bound the matches
+    start = lower_bound(sorted_books, target, key_func)
+    stop = upper_bound(sorted_books, target, key_func, start)
+    return list(BookRange(sorted_books, start, stop))
+
+# Persistence: append-only journal plus compacted snapshots
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "library_data")
+
+def _date_to_json(value):
+    return value.isoformat() if value is not None else None
+
+def _date_from_json(value):
+    return datetime.datetime.fromisoformat(value) if value is not None else None
+
+class LibraryStorage:
+    # Every change is one JSON line in the journal, fsync'd in groups instead of once per line
+    # A snapshot holds the whole state up to a sequence number, so startup reads it and
+    # replays only the journal lines written after it. The books of a snapshot are a mapped
+    # catalog file, so startup does not build a node per book
+    SNAPSHOT_FILE = "snapshot.json"
+    JOURNAL_FILE = "journal.log"
+    CATALOG_PREFIX = "catalog-"
+    
+    def __init__(self, directory=DATA_DIR, group_size=64, group_delay=0.2, snapshot_every=10000):
+        self.directory = directory
+        self.group_size = group_size  # Sync once this many lines are pending
+        self.group_delay = group_delay  # or once the oldest pending line is this many seconds old
+        self.snapshot_every = snapshot_every  # Journal lines before a compaction is due
+        self.seq = 0  # Sequence number of the last change
+        self.pending = 0
+        self.first_pending = 0.0
+        self.since_snapshot = 0
+        self.generation = 0  # Numbers the catalog files, a new one per snapshot
+        self.journal = None
+        self.lock = threading.RLock()  # Journal lines and counters are shared by all writers
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def load(self):
+        # O(snapshot + journal tail), returns (books, users), or None when nothing was saved yet
+        snapshot_path = self._path(self.SNAPSHOT_FILE)
+        journal_path = self._path(self.JOURNAL_FILE)
+        if not os.path.exists(snapshot_path) and not os.path.exists(journal_path):
+            self._open_journal()
+            return None
+        
+        books = BookBST()
+        users = UserHashTable()
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if "catalog" in snapshot:
+                # O(loans), books are materialized from the mapping when first needed
+                books.attach_catalog(MappedCatalog(self._path(snapshot["catalog"])))
+                self.generation = snapshot["generation"]
+            else:
+                # Older snapshots list the books, in ID order, so this is a single balanced build
+                books.bulk_load((book_id, title, author, genre, checkout_user, _date_from_json(due_date))
+                                for book_id, title, author, genre, checkout_user, due_date in snapshot["books"])
+            for user_id, name, email in snapshot["users"]:
+                users.insert(user_id, name, email)
+            books.ids.observe(snapshot["book_high_water"])
+            users.ids.observe(snapshot["user_high_water"])
+            self.seq = snapshot["seq"]
+        
+        if os.path.exists(journal_path):
+            good_end = 0
+            with open(journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line from a crash mid-write
+                    good_end += len(line)
+                    if record["seq"] <= self.seq:
+                        continue  # Already in the snapshot
+                    apply_journal_record(books, users, record)
+                    self.seq = record["seq"]
+                    self.since_snapshot += 1
+            if good_end < os.path.getsize(journal_path):
+                with open(journal_path, "r+b") as f:
+                    f.truncate(good_end)
+        
+        self._open_journal()
+        return books, users
+    
+    def _open_journal(self):
+        self.journal = open(self._path(self.JOURNAL_FILE), "a", encoding="utf-8")
+    
+    def log(self, op, **fields):
+        # O(1), the line is durable after the next sync
+        with self.lock:
+            self.seq += 1
+            record = {"seq": self.seq, "op": op}
+            record.update(fields)
+            self.journal.write(json.dumps(record) + "\n")
+            if self.pending == 0:
+                self.first_pending = time.monotonic()
+            self.pending += 1
+            self.since_snapshot += 1
+            if self.pending >= self.group_size:
+                self.sync()
+    
+    def sync_due(self):
+        return self.pending > 0 and time.monotonic() - self.first_pending >= self.group_delay
+    
+    def sync(self):
+        # One fsync covers every line written since the last one
+        with self.lock:
+            if self.pending:
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+                self.pending = 0
+    
+    def snapshot_due(self):
+        return self.since_snapshot >= self.snapshot_every
+    
+    def snapshot(self, books, users):
+        # O(n), writes the full state atomically, then starts an empty journal
+        # Callers must keep the books and users from changing meanwhile
+        with self.lock:
+            self._write_snapshot(books, users)
+    
+    def _write_snapshot(self, books, users):
+        self.sync()
+        # Each snapshot gets a new catalog file, the one the last snapshot names stays
+        # intact until this snapshot has replaced it
+        self.generation += 1
+        catalog_name = f"{self.CATALOG_PREFIX}{self.generation}.bin"
+        write_catalog_file(self._path(catalog_name), books.catalog_records(), books.ids.high_water)
+        snapshot = {
+            "seq": self.seq,
+            "generation": self.generation,
+            "book_high_water": books.ids.high_water,
+            "user_high_water": users.ids.high_water,
+            "catalog": catalog_name,
+            "users": sorted(users.get_all_users()),
+        }
+        temp_path = self._path(self.SNAPSHOT_FILE + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path(self.SNAPSHOT_FILE))
+        
+        if books.backing is not None:
+            # The new file holds every book, the tree moves off the old mapping
+            books.swap_catalog(MappedCatalog(self._path(catalog_name)))
+        for name in os.listdir(self.directory):
+            if name.startswith(self.CATALOG_PREFIX) and name != catalog_name:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass  # Still mapped on a platform that forbids removing it, the next snapshot retries
+        
+        # A crash before this truncate is harmless, replay skips lines the snapshot covers
+        self.journal.close()
+        self.journal = open(self._path(self.JOURNAL_FILE), "w", encoding="utf-8")
+        self.since_snapshot = 0
+    
+    def close(self):
+        with self.lock:
+            if self.journal is not None:
+                self.sync()
+                self.journal.close()
+                self.journal = None
+
+def apply_journal_record(books, users, record):
+    op = record["op"]
+    if op == "add_book":
+        books.insert(record["book_id"], record["title"], record["author"], record["genre"])
+    elif op == "delete_book":
+        books.materialize(record["book_id"])
+        books.delete(record["book_id"])
+    elif op == "checkout":
+        books.check_out(books.materialize(record["book_id"]), record["user_id"], _date_from_json(record["due_date"]))
+    elif op == "return":
+        books.check_in(books.materialize(record["book_id"]))
+    elif op == "add_user":
+        users.insert(record["user_id"], record["name"], record["email"])
+    elif op == "remove_user":
+        users.remove(record["user_id"])
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+# Streaming import and export of books, users and loans (.csv or .jsonl)
+BOOK_FIELDS = ("book_id", "title", "author", "genre")
+USER_FIELDS = ("user_id", "name", "email")
+LOAN_FIELDS = ("book_id", "user_id", "due_date")
+
+def _read_rows(path):
+    # Yields (line_number, row dict or None, error message or None, bytes read), one row in memory at a time
+    with open(path, "rb") as f:
+        lines = (line.decode("utf-8-sig") for line in f)
+        if path.endswith(".jsonl"):
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    yield line_number, None, f"Invalid JSON: {error}", f.tell()
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, "Expected a JSON object", f.tell()
+                    continue
+                yield line_number, row, None, f.tell()
+        else:
+            reader = csv.DictReader(lines)
+            for row in reader:
+                yield reader.line_num, row, None, f.tell()
+
+def _write_rows(path, fields, rows):
+    # rows is any iterable of tuples, nothing is collected first
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(dict(zip(fields, row))) + "\n")
+                count += 1
         else:
-            right = mid - 1
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+class ImportReport:
+    # Outcome of one import, errors beyond max_errors are counted but not kept
+    def __init__(self, max_errors=1000):
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []  # (line_number, message)
+        self.max_errors = max_errors
     
-    if first_occurrence == -1:
-        return []
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_number, message))
+
+def _run_import(path, parse, load_chunk, chunk_size, progress, on_error):
+    # Shared driver: parse each row, load valid rows chunk by chunk, report progress per chunk
+    report = ImportReport()
+    total_bytes = os.path.getsize(path)
+    chunk = []
+    bytes_read = 0
     
-    # Find all matching books (since we might have multiple books with same key)
-    results = []
-    for i in range(first_occurrence, len(sorted_books)):
-        if key_func(sorted_books[i]) == target:
-            results.append(sorted_books[i])
+    def fail(line_number, message):
+        report.error(line_number, message)
+        if on_error is not None:
+            on_error(line_number, message)
+    
+    for line_number, row, message, bytes_read in _read_rows(path):
+        report.rows += 1
+        if message is None:
+            try:
+                chunk.append((line_number, parse(row)))
+            except ValueError as error:
+                message = str(error)
+        if message is not None:
+            fail(line_number, message)
+        if len(chunk) >= chunk_size:
+            report.imported += load_chunk(chunk, fail)
+            chunk = []
+            if progress is not None:
+                progress(report.rows, bytes_read, total_bytes)
+    
+    if chunk:
+        report.imported += load_chunk(chunk, fail)
+    if progress is not None:
+        progress(report.rows, bytes_read, total_bytes)
+    return report
+
+def _field(row, field):
+    # Stripped text of a required field, CSV rows with missing columns hold None
+    value = row.get(field)
+    if value is None or not str(value).strip():
+        raise ValueError(f"Missing field '{field}'")
+    return str(value).strip()
+
+def import_books(path, books, chunk_size=10000, progress=None, on_error=None):
+    # O(file size) time, O(chunk_size) memory, progress(rows, bytes_read, total_bytes) after each chunk
+    def parse(row):
+        return (int(_field(row, "book_id")), _field(row, "title"), _field(row, "author"), _field(row, "genre"))
+    
+    def load_chunk(chunk, fail):
+        records = []
+        seen = set()
+        for line_number, record in chunk:
+            if record[0] in seen or books.search(record[0]) is not None:
+                fail(line_number, f"Duplicate book ID {record[0]}")
+                continue
+            seen.add(record[0])
+            records.append(record)
+        # A rebuild is O(n + k), below that size k inserts of O(log n) are cheaper
+        if 8 * len(records) >= len(books.books_list):
+            books.bulk_load(records)
         else:
-            break
+            for record in records:
+                books.insert(*record)
+        return len(records)
     
-    return results
+    return _run_import(path, parse, load_chunk, chunk_size, progress, on_error)
+
+def import_users(path, users, chunk_size=10000, progress=None, on_error=None):
+    def parse(row):
+        user_id = int(_field(row, "user_id"))
+        if user_id <= 0:
+            raise ValueError(f"User ID must be positive, got {user_id}")
+        return (user_id, _field(row, "name"), _field(row, "email"))
+    
+    def load_chunk(chunk, fail):
+        count = 0
+        for line_number, (user_id, name, email) in chunk:
+            if users.get(user_id) is not None:
+                fail(line_number, f"Duplicate user ID {user_id}")
+                continue
+            try:
+                users.insert(user_id, name, email)
+            except ValueError as error:
+                fail(line_number, str(error))
+                continue
+            count += 1
+        return count
+    
+    return _run_import(path, parse, load_chunk, chunk_size, progress, on_error)
+
+def import_loans(path, books, users, loans=None, due_dates=None, chunk_size=10000, progress=None, on_error=None):
+    # Books and users must already exist, loans and due_dates are updated when given
+    def parse(row):
+        return (int(_field(row, "book_id")), int(_field(row, "user_id")), datetime.datetime.fromisoformat(_field(row, "due_date")))
+    
+    def load_chunk(chunk, fail):
+        count = 0
+        for line_number, (book_id, user_id, due_date) in chunk:
+            book = books.materialize(book_id)
+            if book is None or users.get(user_id) is None:
+                fail(line_number, f"Unknown book {book_id} or user {user_id}")
+                continue
+            if not book.available:
+                fail(line_number, f"Book {book_id} is already checked out")
+                continue
+            books.check_out(book, user_id, due_date)
+            if loans is not None:
+                loans.add(book_id, user_id)
+            if due_dates is not None:
+                due_dates.push(book_id, user_id, due_date)
+            count += 1
+        return count
+    
+    return _run_import(path, parse, load_chunk, chunk_size, progress, on_error)
+
+def export_books(path, books):
+    # O(n), streamed in ID order, returns the number of rows written
+    # Books still in a mapped catalog are read from it, nothing is materialized
+    return _write_rows(path, BOOK_FIELDS, (record[:4] for record in books.catalog_records()))
+
+def export_users(path, users):
+    return _write_rows(path, USER_FIELDS, sorted(users.get_all_users()))
+
+def export_loans(path, books):
+    return _write_rows(path, LOAN_FIELDS, ((book.book_id, book.checkout_user, book.due_date.isoformat())
+                                           for book in books.inorder() if not book.available))
 
 # Generate book data
 def generate_books(num_books=100):
@@ -253,58 +2021,1091 @@ def generate_books(num_books=100):
         "J.M. Barrie", "Madeleine L'Engle", "Katherine Paterson", "Lois Lowry"
     ]
     
-    # Generating a mix of predefined and random books
-    for i in range(min(num_books, len(book_titles))):
-        books_bst.insert(
-            i + 1,
-            book_titles[i],
-            authors[i],
-            random.choice(genres)
-        )
+    # Generating a mix of predefined and random books
+    records = []
+    for i in range(min(num_books, len(book_titles))):
+        records.append((
+            i + 1,
+            book_titles[i],
+            authors[i],
+            random.choice(genres)
+        ))
+    
+    # If more than 100 books are requested, generate random ones
+    for i in range(len(book_titles), num_books):
+        random_title = "Book " + ''.join(random.choices(string.ascii_uppercase, k=3)) + "-" + str(i)
+        random_author = "Author " + ''.join(random.choices(string.ascii_uppercase, k=2))
+        records.append((
+            i + 1,
+            random_title,
+            random_author,
+            random.choice(genres)
+        ))
+    
+    # IDs are sequential, so the tree is built balanced in one pass
+    books_bst.bulk_load(records)
+    return books_bst
+
+# User data generator
+def generate_users(num_users=20, table_class=UserHashTable):
+    users = table_class()
+    
+    first_names = ["John", "Jane", "Michael", "Emily", "David", "Sarah", "Robert", "Jessica", "William", "Jennifer"]
+    last_names = ["Smith", "Johnson", "Williams", "Jones", "Brown", "Davis", "Miller", "Wilson", "Moore", "Taylor"]
+    
+    for i in range(1, num_users + 1):
+        if i <= 10:
+            name = f"{first_names[i-1]} {last_names[i-1]}"
+        else:
+            name = f"{random.choice(first_names)} {random.choice(last_names)}"
+        
+        # Random names repeat, the ID keeps their emails unique
+        suffix = "" if i <= 10 else str(i)
+        email = f"{name.lower().replace(' ', '.')}{suffix}@email.com"
+        users.insert(i, name, email)
+    
+    return users
+
+# Library core: every operation without any UI, shared by the Tk app and the HTTP API
+class LibraryError(Exception):
+    # A rejected operation, the message is meant for the user
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status  # HTTP status used by the API
+
+SORT_FIELDS = {"ID": "book_id", "Title": "title", "Author": "author", "Genre": "genre"}
+
+class StripedLocks:
+    # A fixed pool of locks picked by key, so unrelated books rarely wait on each other
+    # without keeping one lock object per book
+    def __init__(self, stripes=64):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+    
+    def for_key(self, key):
+        return self.locks[hash(key) % len(self.locks)]
+
+class ReadWriteLock:
+    # Many readers or one writer. Circulation reads the tree, adding or deleting records rewrites it
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+    
+    def acquire_read(self):
+        with self.condition:
+            # Waiting writers go first so a steady stream of checkouts cannot starve them
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+    
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+    
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+    
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+    
+    def reading(self):
+        return _LockContext(self.acquire_read, self.release_read)
+    
+    def writing(self):
+        return _LockContext(self.acquire_write, self.release_write)
+
+class _LockContext:
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+    
+    def __enter__(self):
+        self.acquire()
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+def _collect(items, total, progress, step=10000):
+    # list(items), calling progress(done, total) every step items; progress may raise to stop early
+    if progress is None:
+        return list(items)
+    results = []
+    for item in items:
+        results.append(item)
+        if len(results) % step == 0:
+            progress(len(results), total)
+    progress(len(results), total)
+    return results
+
+class LibraryCore:
+    LOAN_DAYS = 14
+    
+    def __init__(self, storage=None):
+        # Safe to call from several threads: circulation shares the catalog and locks only the book it changes,
+        # adding or deleting books and users takes the catalog exclusively
+        # Lock order is catalog_lock, then a book stripe, then user_lock or loan_lock
+        self.catalog_lock = ReadWriteLock()
+        self.book_locks = StripedLocks()
+        self.loan_lock = threading.Lock()  # LoanIndex and DueDateQueue are shared by every book
+        self.user_lock = threading.RLock()  # Held by anything that reads or changes the user table
+        
+        # Load the saved library, or start from generated data on the first run
+        self.storage = storage if storage is not None else LibraryStorage()
+        state = self.storage.load()
+        if state is None:
+            self.books = generate_books(120)  # Generate 120 books
+            self.users = generate_users(20)   # Generate 20 users
+            self._snapshot()
+        else:
+            self.books, self.users = state
+        
+        self.loans = LoanIndex()
+        self.due_dates = DueDateQueue()
+        for book in self.books.get_all_books():
+            if not book.available:
+                self.loans.add(book.book_id, book.checkout_user)
+                self.due_dates.push(book.book_id, book.checkout_user, book.due_date)
+        
+        # Text search results, cleared whenever books are added or removed
+        self.search_cache = QueryCache()
+    
+    # Books
+    def _materialize(self, book_id):
+        # Called without the catalog lock. A book still only in the mapped catalog becomes a node
+        # under the write lock, so lookups under the read lock never change the tree
+        with self.catalog_lock.reading():
+            if self.books.backing is None or self.books.search(book_id) is not None:
+                return
+        with self.catalog_lock.writing():
+            self.books.materialize(book_id)
+    
+    def _materialize_all(self, progress=None):
+        # Called without the catalog lock, before anything that walks the whole catalog.
+        # Only the first such call after startup has work to do
+        with self.catalog_lock.reading():
+            if self.books.backing is None:
+                return
+        with self.catalog_lock.writing():
+            self.books.materialize_all(progress)
+    
+    def find_book(self, book_id):
+        self._materialize(book_id)
+        with self.catalog_lock.reading():
+            return self.books.search(book_id)
+    
+    def require_book(self, book_id):
+        # Callers hold the catalog lock
+        book = self.books.search(book_id)
+        if book is None:
+            raise LibraryError("Book not found!", 404)
+        return book
+    
+    def book_loan(self, book_id):
+        # (book, user who has it or None), read under the book's lock so the two agree
+        self._materialize(book_id)
+        with self.catalog_lock.reading():
+            book = self.require_book(book_id)
+            with self.book_locks.for_key(book_id):
+                user_id = book.checkout_user
+                with self.user_lock:
+                    user = None if user_id is None else self.users.get(user_id)
+        return book, user
+    
+    def search_books(self, term):
+        # An exact ID match wins, otherwise title, author and genre through the trigram index
+        # Several words that never appear together, e.g. "tolkien hobbit", match books that have
+        # every word somewhere through the word index
+        term = term.strip()
+        self._materialize_all()
+        with self.catalog_lock.reading():
+            if not term:
+                return list(self.books.sorted_books("book_id"))
+            if term.isdigit():
+                book = self.books.search(int(term))
+                if book:
+                    return [book]
+            results = self._search_text(term.lower())
+            if not results and len(tokenize(term)) > 1:
+                return self.books.search_terms(term)
+            return results
+    
+    def _search_text(self, query):
+        # Repeated queries come straight from the cache, refined ones filter a cached result
+        # The returned list is shared with the cache and must not be modified
+        cached_query, cached = self.search_cache.lookup(query)
+        if cached_query == query:
+            return cached
+        results = self.books.search_text(query, within=cached)
+        self.search_cache.put(query, results)
+        return results
+    
+    def sorted_books(self, sort_by="ID", progress=None):
+        # Walk the maintained orderings instead of re-sorting the catalog
+        self._materialize_all(progress)
+        with self.catalog_lock.reading():
+            return _collect(self.books.sorted_books(SORT_FIELDS[sort_by]), len(self.books.books_list), progress)
+    
+    def page_books(self, sort_by="ID", offset=0, limit=100):
+        # One page of sorted_books without copying the rest of the catalog
+        self._materialize_all()
+        with self.catalog_lock.reading():
+            return self.books.page_books(SORT_FIELDS[sort_by], offset, limit)
+    
+    def add_book(self, title, author, genre):
+        title, author, genre = title.strip(), author.strip(), genre.strip()
+        if not title or not author or not genre:
+            raise LibraryError("All fields are required!")
+        
+        with self.catalog_lock.writing():
+            # O(1), the tree tracks the highest ID it has handed out
+            book_id = self.books.ids.allocate()
+            book = self.books.insert(book_id, title, author, genre)
+            self.search_cache.clear()
+            self.storage.log("add_book", book_id=book_id, title=title, author=author, genre=genre)
+        return book
+    
+    def delete_book(self, book_id):
+        with self.catalog_lock.writing():
+            self.books.materialize(book_id)
+            book = self.require_book(book_id)
+            if not book.available:
+                raise LibraryError("Cannot delete book that is currently checked out!", 409)
+            self.books.delete(book_id)
+            self.search_cache.clear()
+            self.storage.log("delete_book", book_id=book_id)
+        return book
+    
+    # Users
+    def find_user(self, text):
+        # Patrons may give their email instead of their ID, both lookups are O(1)
+        text = str(text).strip()
+        if "@" in text:
+            with self.user_lock:
+                return self.users.get_by_email(text)
+        try:
+            user_id = int(text)
+        except ValueError:
+            raise LibraryError("Invalid user ID!")
+        with self.user_lock:
+            return self.users.get(user_id)
+    
+    def require_user(self, text):
+        user = self.find_user(text)
+        if user is None:
+            raise LibraryError("User not found!", 404)
+        return user
+    
+    def sorted_users(self, progress=None):
+        # O(n) walk over the ID index, whatever the IDs are, and unlike one long sorted()
+        # call the loop lets other threads run in between
+        with self.user_lock:
+            return _collect(self.users.users_by_id(), self.users.num_users, progress)
+    
+    def page_users(self, offset=0, limit=100, prefix=None):
+        # O(n / block size + limit) through the ID index, whatever the IDs are
+        with self.user_lock:
+            if prefix is not None:
+                return self.users.search_by_name_prefix(prefix)[offset:offset + limit]
+            return self.users.page_by_id(offset, limit)
+    
+    def add_user(self, name, email):
+        name, email = name.strip(), email.strip()
+        if not name or not email:
+            raise LibraryError("All fields are required!")
+        
+        with self.catalog_lock.writing(), self.user_lock:
+            # O(1) duplicate check through the email index
+            if self.users.get_by_email(email):
+                raise LibraryError(f"Email '{email}' is already registered!", 409)
+            
+            # O(1), the table tracks the highest ID it has handed out
+            user_id = self.users.ids.allocate()
+            self.users.insert(user_id, name, email)
+            self.storage.log("add_user", user_id=user_id, name=name, email=email)
+        return (user_id, name, email)
+    
+    def delete_user(self, user_id):
+        with self.catalog_lock.writing(), self.user_lock:
+            user = self.require_user(user_id)
+            if self.loans.has_loans(user[0]):
+                raise LibraryError("Cannot delete user who has books checked out!", 409)
+            self.users.remove(user[0])
+            self.storage.log("remove_user", user_id=user[0])
+        return user
+    
+    # Loans
+    def has_loans(self, user_id):
+        with self.loan_lock:
+            return self.loans.has_loans(user_id)
+    
+    def user_books(self, user_id):
+        # O(k log n) for the user's k loans, in book ID order
+        with self.catalog_lock.reading():
+            with self.loan_lock:
+                book_ids = sorted(self.loans.books_for_user(user_id))
+            return [self.books.search(book_id) for book_id in book_ids]
+    
+    def checked_out_books(self, progress=None):
+        # (book, user) for every loan, in book ID order
+        results = []
+        with self.catalog_lock.reading():
+            with self.loan_lock:
+                book_ids = sorted(self.loans.checked_out)
+            for book_id in book_ids:
+                book = self.books.search(book_id)
+                user_id = book.checkout_user
+                if user_id is not None:
+                    with self.user_lock:
+                        results.append((book, self.users.get(user_id)))
+                if progress is not None and len(results) % 10000 == 0:
+                    progress(len(results), len(book_ids))
+        return results
+    
+    def checkout(self, book_id, user_ref):
+        self._materialize(book_id)
+        with self.catalog_lock.reading():
+            book = self.require_book(book_id)
+            user = self.require_user(user_ref)
+            
+            # Check-then-set under the book's own lock, two desks can never both get the same copy
+            with self.book_locks.for_key(book_id):
+                if not book.available:
+                    raise LibraryError("This book is already checked out!", 409)
+                
+                user_id = user[0]
+                due_date = datetime.datetime.now() + datetime.timedelta(days=self.LOAN_DAYS)
+                self.books.check_out(book, user_id, due_date)
+                with self.loan_lock:
+                    self.loans.add(book_id, user_id)
+                    self.due_dates.push(book_id, user_id, due_date)
+                # Journal order per book follows the book lock, which is all replay needs
+                self.storage.log("checkout", book_id=book_id, user_id=user_id, due_date=_date_to_json(due_date))
+        return book, user
+    
+    def return_book(self, book_id):
+        # Returns the book and the user who had it (None if that user is gone)
+        self._materialize(book_id)
+        with self.catalog_lock.reading():
+            book = self.require_book(book_id)
+            with self.book_locks.for_key(book_id):
+                if book.available:
+                    raise LibraryError("This book is not checked out!", 409)
+                
+                user_id = book.checkout_user
+                with self.user_lock:
+                    user = self.users.get(user_id)
+                self.books.check_in(book)
+                with self.loan_lock:
+                    self.loans.remove(book_id, user_id)
+                    self.due_dates.remove(book_id)
+                self.storage.log("return", book_id=book_id)
+        return book, user
+    
+    # Bulk data
+    def import_file(self, kind, path, progress=None):
+        # progress(bytes_read, total_bytes) after each chunk, raising from it stops the import
+        # after the chunks already loaded
+        def report_progress(rows, bytes_read, total_bytes):
+            if progress is not None:
+                progress(bytes_read, total_bytes)
+        
+        if kind not in ("books", "users", "loans"):
+            raise ValueError(f"Unknown import kind: {kind}")
+        # Imports are not journaled row by row, a snapshot makes them durable
+        if kind == "users":
+            # Only the user table changes, book lookups and circulation carry on meanwhile
+            try:
+                with self.user_lock:
+                    report = import_users(path, self.users, progress=report_progress)
+            finally:
+                self._snapshot()
+            return report
+        
+        with self.catalog_lock.writing():
+            try:
+                if kind == "books":
+                    # Duplicate checks need every book in the tree
+                    self.books.materialize_all(progress)
+                    report = import_books(path, self.books, progress=report_progress)
+                else:
+                    with self.user_lock, self.loan_lock:
+                        report = import_loans(path, self.books, self.users, self.loans, self.due_dates,
+                                              progress=report_progress)
+            finally:
+                self.search_cache.clear()
+                # A books import never reads the user table, user_lock is held for the snapshot only
+                with self.user_lock:
+                    self.storage.snapshot(self.books, self.users)
+        return report
+    
+    def export_file(self, kind, path):
+        if kind == "loans":
+            # Checkouts change book fields under the read lock, the writing side keeps them still
+            with self.catalog_lock.writing():
+                return export_loans(path, self.books)
+        if kind not in ("books", "users"):
+            raise ValueError(f"Unknown export kind: {kind}")
+        with self.catalog_lock.reading(), self.user_lock:
+            if kind == "books":
+                return export_books(path, self.books)
+            return export_users(path, self.users)
+    
+    # Storage upkeep, called periodically by whichever front end drives the core
+    def maintain(self):
+        # Group commit and compaction run from the event loop, not inside each action
+        if self.storage.sync_due():
+            self.storage.sync()
+        if self.storage.snapshot_due():
+            self._snapshot()
+    
+    def _snapshot(self):
+        # The snapshot must see every user, so nothing may touch the user table while it is written;
+        # the journal is truncated right after
+        with self.catalog_lock.writing(), self.user_lock:
+            self.storage.snapshot(self.books, self.users)
+    
+    def close(self):
+        self.storage.close()
+        with self.catalog_lock.writing():
+            if self.books.backing is not None:
+                self.books.backing.close()
+                self.books.backing = None
+
+# Instrumentation: per-operation latency histograms and structure gauges
+# Off by default. enable() swaps timing wrappers in for the probed functions and disable()
+# puts the originals back, so a disabled build runs exactly the uninstrumented code
+class LatencyHistogram:
+    # Power of two buckets in microseconds: bucket b counts durations below 2**b us
+    BUCKETS = 24  # The last bucket also takes everything from ~8 s up
+    
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+    
+    def record(self, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+    
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction of calls, in microseconds
+        target = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return float(2 ** bucket)
+        return 0.0
+    
+    def summary(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+                "p50_us": min(self.percentile(0.5), self.max * 1e6),
+                "p99_us": min(self.percentile(0.99), self.max * 1e6),
+                "max_us": self.max * 1e6,
+                "buckets_us": {f"<{2 ** bucket}": count for bucket, count in enumerate(self.counts) if count},
+            }
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}  # Operation name -> LatencyHistogram, kept across enable/disable
+        self.originals = []  # (owner, attribute, original) while enabled
+    
+    def probes(self):
+        # (operation, owner, attribute); owners are classes or this module
+        module = sys.modules[__name__]
+        return [
+            ("search", LibraryCore, "search_books"),
+            ("search.book_id", BookBST, "search"),
+            ("search.text", BookBST, "search_text"),
+            ("insert.book", BookBST, "insert"),
+            ("insert.user", UserHashTable, "insert"),
+            ("insert.user", OpenUserHashTable, "insert"),
+            ("checkout", LibraryCore, "checkout"),
+            ("return", LibraryCore, "return_book"),
+            ("sort.books", LibraryCore, "sorted_books"),
+            ("sort.users", LibraryCore, "sorted_users"),
+            ("sort.merge_sort", module, "merge_sort_books"),
+            ("resize.users", UserHashTable, "_resize"),
+            ("resize.users", OpenUserHashTable, "_resize"),
+        ]
+    
+    def enable(self):
+        if self.enabled:
+            return
+        for name, owner, attribute in self.probes():
+            original = getattr(owner, attribute)
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, self._timed(name, original))
+        self.enabled = True
+    
+    def disable(self):
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+        self.enabled = False
+    
+    def reset(self):
+        self.histograms = {}
+        if self.enabled:
+            self.disable()
+            self.enable()
+    
+    def _timed(self, name, func):
+        histogram = self.histograms.setdefault(name, LatencyHistogram())
+        clock = time.perf_counter
+        
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(clock() - start)
+        
+        timed.__name__ = func.__name__
+        timed.__wrapped__ = func
+        return timed
+    
+    def operations(self):
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+METRICS = Metrics()
+
+def structure_stats(core):
+    # Gauges read on demand, the chain scan is O(table size)
+    books, users = core.books, core.users
+    with core.user_lock:
+        user_stats = {
+            "table": type(users).__name__,
+            "users": users.num_users,
+            "capacity": users.size,
+            "load_factor": users.load_factor(),
+            "max_chain": users.max_chain(),
+            "resizes": users.resizes,
+        }
+    return {
+        "books": {
+            "books": len(books.books_list),
+            "bst_height": books.tree_height(),
+            "search_cache_entries": len(core.search_cache),
+        },
+        "users": user_stats,
+        "loans": {"checked_out": len(core.loans.checked_out)},
+    }
+
+def dump_metrics(core, path=None):
+    # Everything in one JSON document, written to path or returned
+    report = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "instrumentation_enabled": METRICS.enabled,
+        "operations": METRICS.operations(),
+        "structures": structure_stats(core),
+    }
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def book_to_json(book):
+    return {
+        "book_id": book.book_id,
+        "title": book.title,
+        "author": book.author,
+        "genre": book.genre,
+        "available": book.available,
+        "checkout_user": book.checkout_user,
+        "due_date": _date_to_json(book.due_date),
+    }
+
+def user_to_json(user):
+    return {"user_id": user[0], "name": user[1], "email": user[2]}
+
+def _page_params(query):
+    # (offset, limit) from ?offset=&limit=, a ValueError becomes a 400 response
+    offset = int(query.get("offset", 0))
+    limit = int(query.get("limit", 100))
+    if offset < 0 or limit < 0:
+        raise ValueError("offset and limit must not be negative")
+    return offset, limit
+
+def _text_fields(data, *fields):
+    # The named fields of a JSON body, each of which must be a string
+    values = []
+    for field in fields:
+        value = data[field]
+        if not isinstance(value, str):
+            raise LibraryError(f"Field '{field}' must be a string")
+        values.append(value)
+    return values
+
+# HTTP/JSON API: python haha.py --serve [port]
+class LibraryServer:
+    # Minimal HTTP/1.1 with keep-alive on asyncio, many connections share one LibraryCore
+    # Handlers run on the event loop one at a time, the core's own locks keep them safe
+    # alongside the maintenance tick and any other thread sharing the core
+    MAX_BODY = 1 << 20
+    
+    def __init__(self, core, host="127.0.0.1", port=8080):
+        self.core = core
+        self.host = host
+        self.port = port
+        self.routes = [
+            ("GET", re.compile(r"/books"), self.get_books),
+            ("POST", re.compile(r"/books"), self.post_book),
+            ("GET", re.compile(r"/books/(\d+)"), self.get_book),
+            ("DELETE", re.compile(r"/books/(\d+)"), self.delete_book),
+            ("GET", re.compile(r"/users"), self.get_users),
+            ("POST", re.compile(r"/users"), self.post_user),
+            ("GET", re.compile(r"/users/([^/]+)"), self.get_user),
+            ("DELETE", re.compile(r"/users/(\d+)"), self.delete_user),
+            ("GET", re.compile(r"/users/(\d+)/books"), self.get_user_books),
+            ("GET", re.compile(r"/loans"), self.get_loans),
+            ("POST", re.compile(r"/checkout"), self.post_checkout),
+            ("POST", re.compile(r"/return"), self.post_return),
+            ("GET", re.compile(r"/stats"), self.get_stats),
+        ]
+    
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        maintenance = asyncio.create_task(self.maintain())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            maintenance.cancel()
+            self.core.close()
+    
+    async def maintain(self):
+        # A snapshot writes and fsyncs the whole library, on a worker thread so requests keep flowing
+        while True:
+            await asyncio.sleep(0.1)
+            await asyncio.to_thread(self.core.maintain)
+    
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                length = int(headers.get("content-length") or 0)
+                if length > self.MAX_BODY:
+                    status, payload = 413, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = self.dispatch(request_line.decode("latin-1"), body)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n"
+                             % (status, _HTTP_REASONS.get(status, "OK").encode(), len(data),
+                                b"" if keep_alive else b"Connection: close\r\n"))
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    def dispatch(self, request_line, body):
+        # Returns (status, JSON payload)
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return 400, {"error": "Malformed request line"}
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict):
+                    raise ValueError("Expected a JSON object")
+                return handler(*match.groups(), query=query, data=data)
+            except LibraryError as error:
+                return error.status, {"error": str(error)}
+            except (KeyError, TypeError, ValueError) as error:
+                return 400, {"error": f"Bad request: {error}"}
+        return (405, {"error": "Method not allowed"}) if allowed else (404, {"error": "Not found"})
+    
+    def get_books(self, query, data):
+        offset, limit = _page_params(query)
+        if "q" in query:
+            books = self.core.search_books(query["q"])[offset:offset + limit]
+        else:
+            books = self.core.page_books(query.get("sort", "ID"), offset, limit)
+        return 200, {"books": [book_to_json(book) for book in books]}
     
-    # If more than 100 books are requested, generate random ones
-    for i in range(len(book_titles), num_books):
-        random_title = "Book " + ''.join(random.choices(string.ascii_uppercase, k=3)) + "-" + str(i)
-        random_author = "Author " + ''.join(random.choices(string.ascii_uppercase, k=2))
-        books_bst.insert(
-            i + 1,
-            random_title,
-            random_author,
-            random.choice(genres)
-        )
+    def get_book(self, book_id, query, data):
+        book = self.core.find_book(int(book_id))
+        if book is None:
+            raise LibraryError("Book not found!", 404)
+        return 200, book_to_json(book)
     
-    return books_bst
+    def post_book(self, query, data):
+        return 201, book_to_json(self.core.add_book(*_text_fields(data, "title", "author", "genre")))
+    
+    def delete_book(self, book_id, query, data):
+        return 200, book_to_json(self.core.delete_book(int(book_id)))
+    
+    def get_users(self, query, data):
+        offset, limit = _page_params(query)
+        users = self.core.page_users(offset, limit, query.get("prefix"))
+        return 200, {"users": [user_to_json(user) for user in users]}
+    
+    def get_user(self, user_ref, query, data):
+        return 200, user_to_json(self.core.require_user(urllib.parse.unquote(user_ref)))
+    
+    def post_user(self, query, data):
+        return 201, user_to_json(self.core.add_user(*_text_fields(data, "name", "email")))
+    
+    def delete_user(self, user_id, query, data):
+        return 200, user_to_json(self.core.delete_user(int(user_id)))
+    
+    def get_user_books(self, user_id, query, data):
+        user = self.core.require_user(user_id)
+        return 200, {"books": [book_to_json(book) for book in self.core.user_books(user[0])]}
+    
+    def get_stats(self, query, data):
+        return 200, dump_metrics(self.core)
+    
+    def get_loans(self, query, data):
+        loans = []
+        for book, user in self.core.checked_out_books():
+            loan = book_to_json(book)
+            loan["user_name"] = user[1] if user else None
+            loans.append(loan)
+        return 200, {"loans": loans}
+    
+    def post_checkout(self, query, data):
+        book, user = self.core.checkout(int(data["book_id"]), data["user"])
+        return 200, {"book": book_to_json(book), "user": user_to_json(user)}
+    
+    def post_return(self, query, data):
+        book, user = self.core.return_book(int(data["book_id"]))
+        return 200, {"book": book_to_json(book), "user": user_to_json(user) if user else None}
 
-# User data generator
-def generate_users(num_users=20):
-    users = UserHashTable()
+_HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+                 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large"}
+
+# View layer: Treeviews that only hold the rows on screen
+class VirtualTreeview:
+    # Tk items exist only for the visible rows plus BUFFER rows above and below, reused as the
+    # list scrolls, so a 100k book catalog costs the same few dozen items as a short one.
+    # Every update is diffed against what each item already shows and only changed cells are set
+    BUFFER = 20
     
-    first_names = ["John", "Jane", "Michael", "Emily", "David", "Sarah", "Robert", "Jessica", "William", "Jennifer"]
-    last_names = ["Smith", "Johnson", "Williams", "Jones", "Brown", "Davis", "Miller", "Wilson", "Moore", "Taylor"]
+    def __init__(self, tree, scrollbar, key, values):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.key = key  # row -> identity, e.g. the book ID
+        self.values = values  # row -> tuple of cell values, one per column
+        self.columns = tuple(tree.cget("columns") or ())
+        self.rows = []
+        self.first = 0  # Index of the top visible row
+        self.start = 0  # Index of the row shown by the first Tk item
+        self.visible = 25  # Rows that fit, updated when the tree is resized
+        self.items = []  # Tk item IDs, item i shows rows[start + i]
+        self.shown = []  # (key, values) each item currently displays
+        
+        scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", self.on_configure)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(sequence, self.on_wheel)
     
-    for i in range(1, num_users + 1):
-        if i <= 10:
-            name = f"{first_names[i-1]} {last_names[i-1]}"
+    def set_rows(self, rows, scroll_to_top=False):
+        # O(window), rows can be any sequence, only the slice on screen is read
+        self.rows = rows
+        if scroll_to_top:
+            self.first = 0
+        self.render()
+    
+    def refresh_row(self, key):
+        # O(window), one row changed in place (a checkout or return): only the held rows can show
+        # it, any other row is read fresh when it scrolls into the window
+        for slot, shown in enumerate(self.shown):
+            if shown is not None and shown[0] == key:
+                self.show(slot, self.rows[self.start + slot])
+    
+    def render(self):
+        count = len(self.rows)
+        self.first = max(0, min(self.first, count - self.visible))
+        size = min(count, self.visible + 2 * self.BUFFER)
+        # Move the held window only when the visible rows leave it
+        if (self.first < self.start or self.first + self.visible > self.start + size
+                or self.start + size > count or size != len(self.items)):
+            self.start = max(0, min(self.first - self.BUFFER, count - size))
+        
+        while len(self.items) < size:
+            self.items.append(self.tree.insert("", "end", values=()))
+            self.shown.append(None)
+        if len(self.items) > size:
+            self.tree.delete(*self.items[size:])
+            del self.items[size:], self.shown[size:]
+        
+        for slot in range(size):
+            self.show(slot, self.rows[self.start + slot])
+        
+        if size:
+            self.tree.yview_moveto((self.first - self.start) / size)
+            self.scrollbar.set(self.first / count, min(1.0, (self.first + self.visible) / count))
         else:
-            name = f"{random.choice(first_names)} {random.choice(last_names)}"
-        
-        email = f"{name.lower().replace(' ', '.')}@email.com"
-        users.insert(i, name, email)
+            self.scrollbar.set(0.0, 1.0)
     
-    return users
+    def show(self, slot, row):
+        item = self.items[slot]
+        key, values = self.key(row), self.values(row)
+        shown = self.shown[slot]
+        if shown is None:
+            self.tree.item(item, values=values)
+        elif shown[1] != values:
+            for column, value, before in zip(self.columns, values, shown[1]):
+                if value != before:
+                    self.tree.set(item, column, value)
+        if shown is not None and shown[0] != key:
+            # The item now shows another row, the selection belonged to the old one
+            self.tree.selection_remove(item)
+        self.shown[slot] = (key, values)
+    
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", count, "units" | "pages")
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            self.first += int(args[1]) * (self.visible if args[2] == "pages" else 1)
+        self.render()
+    
+    def on_wheel(self, event):
+        if event.num == 4 or event.num == 5:
+            step = -3 if event.num == 4 else 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        self.yview("scroll", step, "units")
+        return "break"
+    
+    def on_configure(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - row_height) // row_height)  # minus the heading row
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+def book_row_values(book):
+    status = "Available" if book.available else "Checked Out"
+    return (book.book_id, book.title, book.author, book.genre, status)
+
+def loan_row_values(loan):
+    book, user = loan
+    due_date = book.due_date.strftime("%Y-%m-%d") if book.due_date else "N/A"
+    return (book.book_id, book.title, user[1], due_date)
+
+# Background work: long core operations run on worker threads, Tk widgets are only touched
+# from the Tk thread. Threads rather than processes, the workers share the core and its locks,
+# and the Tk thread still gets the GIL every few milliseconds to repaint
+class TaskCancelled(Exception):
+    pass
+
+class BackgroundTask:
+    def __init__(self, runner, lane, label, work, on_done, on_error):
+        self.runner = runner
+        self.lane = lane
+        self.label = label
+        self.work = work  # work(progress) -> result, on a worker thread
+        self.on_done = on_done  # on_done(result), on the Tk thread
+        self.on_error = on_error
+        self.cancelled = False
+    
+    def progress(self, done, total):
+        # Called by the work; raising here is how a cancelled operation stops
+        if self.cancelled:
+            raise TaskCancelled()
+        self.runner.messages.put(("progress", self, (done, total)))
+    
+    def run(self):
+        # Exactly one of done, error or cancelled is sent, even for a task that never started
+        if self.cancelled:
+            self.runner.messages.put(("cancelled", self, TaskCancelled()))
+            return
+        try:
+            result = self.work(self.progress)
+        except TaskCancelled as error:
+            self.runner.messages.put(("cancelled", self, error))
+        except Exception as error:
+            self.runner.messages.put(("error", self, error))
+        else:
+            self.runner.messages.put(("done", self, result))
+
+class TaskRunner:
+    # One task per lane (a tab): submitting to a busy lane cancels the task it supersedes
+    # Results and progress come back through a queue the Tk thread drains every POLL_MS
+    POLL_MS = 30
+    
+    def __init__(self, root, workers=2):
+        self.root = root
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.messages = queue.Queue()
+        self.current = {}  # lane -> running task
+        self.status_bars = {}  # lane -> TaskStatusBar
+        self.poll_job = self.root.after(self.POLL_MS, self.poll)
+    
+    def submit(self, lane, label, work, on_done, on_error=None):
+        # lane None is for changes like a checkout: never superseded, their result always arrives
+        task = BackgroundTask(self, lane, label, work, on_done, on_error or self.show_error)
+        if lane is not None:
+            self.cancel(lane)
+            self.current[lane] = task
+            self._show(lane, task.label, 0, 0)
+        self.executor.submit(task.run)
+        return task
+    
+    def busy(self, lane):
+        return lane in self.current
+    
+    def cancel(self, lane):
+        # The worker stops at its next progress call, its on_error then gets a TaskCancelled
+        task = self.current.pop(lane, None)
+        if task is not None:
+            task.cancelled = True
+            self._show(lane, None, 0, 0)
+    
+    def poll(self):
+        while True:
+            try:
+                kind, task, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if task.cancelled:
+                # Results of a superseded task are stale, but work it did before stopping
+                # (the rows an import already loaded) may still need a refresh
+                if kind != "progress":
+                    task.on_error(payload if kind == "cancelled" else TaskCancelled())
+                continue
+            if kind == "progress":
+                self._show(task.lane, task.label, *payload)
+                continue
+            if task.lane is not None:
+                del self.current[task.lane]
+                self._show(task.lane, None, 0, 0)
+            if kind == "done":
+                task.on_done(payload)
+            else:
+                task.on_error(payload)
+        self.poll_job = self.root.after(self.POLL_MS, self.poll)
+    
+    def _show(self, lane, label, done, total):
+        status_bar = self.status_bars.get(lane)
+        if status_bar is not None:
+            status_bar.show(label, done, total)
+    
+    def show_error(self, error):
+        if not isinstance(error, TaskCancelled):
+            messagebox.showerror("Error", str(error))
+    
+    def shutdown(self):
+        for lane in list(self.current):
+            self.cancel(lane)
+        self.root.after_cancel(self.poll_job)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+TASK_LANES = {"books": "books", "users": "users", "loans": "checkout"}  # Tab whose lane runs an import or export
+
+class TaskStatusBar:
+    # Label, progress bar and Cancel button for one lane, hidden text when the lane is idle
+    def __init__(self, parent, runner, lane):
+        self.frame = ttk.Frame(parent)
+        self.label = ttk.Label(self.frame, text="")
+        self.label.pack(side='left', padx=5)
+        self.bar = ttk.Progressbar(self.frame, mode='determinate', maximum=100, length=150)
+        self.bar.pack(side='left', fill='x', expand=True, padx=5)
+        self.cancel_button = ttk.Button(self.frame, text="Cancel", state='disabled',
+                                        command=lambda: runner.cancel(lane))
+        self.cancel_button.pack(side='left', padx=5)
+        runner.status_bars[lane] = self
+    
+    def show(self, label, done, total):
+        self.bar.stop()
+        if label is None:
+            self.label.config(text="")
+            self.bar.config(mode='determinate', value=0)
+            self.cancel_button.config(state='disabled')
+            return
+        self.label.config(text=f"{label}...")
+        if total:
+            self.bar.config(mode='determinate', value=100 * done / total)
+        else:
+            # Operations that cannot count their work still show that they are running
+            self.bar.config(mode='indeterminate')
+            self.bar.start(20)
+        self.cancel_button.config(state='normal')
 
 class LibraryManagementSystem:
+    SEARCH_DELAY = 150  # ms without a keystroke before a live search runs
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Library Management System")
         self.root.geometry("1000x600")
         self.root.minsize(800, 500)
         
-        # Initialize data structures
-        self.books = generate_books(120)  # Generate 120 books
-        self.users = generate_users(20)   # Generate 20 users
+        # All operations live in the core, this class only reads the widgets and shows results
+        self.core = LibraryCore()
+        
+        # Anything that can take long runs on a worker, results arrive through self.tasks
+        self.tasks = TaskRunner(self.root)
         
         self.setup_ui()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(100, self.maintain_storage)
+    
+    def maintain_storage(self):
+        # A snapshot is O(n), so it runs on a worker like everything else that grows with the catalog
+        if not self.tasks.busy("storage"):
+            self.tasks.submit("storage", "Saving", lambda progress: self.core.maintain(), lambda result: None)
+        self.root.after(100, self.maintain_storage)
+    
+    def on_close(self):
+        self.tasks.shutdown()
+        self.core.close()
+        self.root.destroy()
     
     def setup_ui(self):
         # Create notebook (tabs)
@@ -315,15 +3116,19 @@ class LibraryManagementSystem:
         self.books_tab = ttk.Frame(self.notebook)
         self.users_tab = ttk.Frame(self.notebook)
         self.checkout_tab = ttk.Frame(self.notebook)
+        self.stats_tab = ttk.Frame(self.notebook)
         
         self.notebook.add(self.books_tab, text='Books Management')
         self.notebook.add(self.users_tab, text='Users Management')
         self.notebook.add(self.checkout_tab, text='Checkout/Return')
+        self.notebook.add(self.stats_tab, text='Stats')
         
         # Setup each tab
         self.setup_books_tab()
         self.setup_users_tab()
         self.setup_checkout_tab()
+        self.setup_stats_tab()
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
     
     def setup_books_tab(self):
         # Left frame for book list
@@ -338,6 +3143,11 @@ class LibraryManagementSystem:
         self.book_search_var = tk.StringVar()
         self.book_search_entry = ttk.Entry(search_frame, textvariable=self.book_search_var)
         self.book_search_entry.pack(side='left', fill='x', expand=True, padx=5)
+        self.book_search_entry.bind("<Return>", lambda e: self.search_books())
+        
+        # Search as you type, once typing pauses for SEARCH_DELAY ms
+        self.search_job = None
+        self.book_search_var.trace_add("write", self.schedule_book_search)
         
         ttk.Button(search_frame, text="Search", command=self.search_books).pack(side='left', padx=5)
         
@@ -352,6 +3162,8 @@ class LibraryManagementSystem:
         sort_combo.pack(side='left', padx=5)
         sort_combo.bind("<<ComboboxSelected>>", lambda e: self.sort_books())
         
+        TaskStatusBar(list_frame, self.tasks, "books").frame.pack(fill='x', padx=5)
+        
         # Book treeview
         self.book_tree = ttk.Treeview(list_frame, columns=("ID", "Title", "Author", "Genre", "Status"))
         self.book_tree.heading("ID", text="ID")
@@ -370,10 +3182,10 @@ class LibraryManagementSystem:
         self.book_tree.pack(fill='both', expand=True, padx=5, pady=5)
         self.book_tree.bind("<Double-1>", self.view_book_details)
         
-        # Scrollbar for treeview
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.book_tree.yview)
+        # Scrollbar for treeview, driven by the view since the tree only holds the rows on screen
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical")
         scrollbar.pack(side='right', fill='y')
-        self.book_tree.configure(yscrollcommand=scrollbar.set)
+        self.book_view = VirtualTreeview(self.book_tree, scrollbar, lambda book: book.book_id, book_row_values)
         
         # Right frame for actions
         action_frame = ttk.Frame(self.books_tab, width=200)
@@ -385,6 +3197,8 @@ class LibraryManagementSystem:
         ttk.Button(action_frame, text="View Selected Book", command=lambda: self.view_book_details(None)).pack(fill='x', pady=5)
         ttk.Button(action_frame, text="Delete Selected Book", command=self.delete_book).pack(fill='x', pady=5)
         ttk.Button(action_frame, text="Refresh List", command=self.refresh_books_list).pack(fill='x', pady=5)
+        ttk.Button(action_frame, text="Import Books...", command=lambda: self.import_data("books")).pack(fill='x', pady=5)
+        ttk.Button(action_frame, text="Export Books...", command=lambda: self.export_data("books")).pack(fill='x', pady=5)
         
         # Load initial data
         self.refresh_books_list()
@@ -394,6 +3208,8 @@ class LibraryManagementSystem:
         list_frame = ttk.Frame(self.users_tab)
         list_frame.pack(side='left', fill='both', expand=True, padx=5, pady=5)
         
+        TaskStatusBar(list_frame, self.tasks, "users").frame.pack(fill='x', padx=5)
+        
         # User treeview
         self.user_tree = ttk.Treeview(list_frame, columns=("ID", "Name", "Email"))
         self.user_tree.heading("ID", text="ID")
@@ -408,9 +3224,9 @@ class LibraryManagementSystem:
         self.user_tree.pack(fill='both', expand=True, padx=5, pady=5)
         
         # Scrollbar for treeview
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.user_tree.yview)
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical")
         scrollbar.pack(side='right', fill='y')
-        self.user_tree.configure(yscrollcommand=scrollbar.set)
+        self.user_view = VirtualTreeview(self.user_tree, scrollbar, lambda user: user[0], tuple)
         
         # Right frame for actions
         action_frame = ttk.Frame(self.users_tab, width=200)
@@ -422,6 +3238,8 @@ class LibraryManagementSystem:
         ttk.Button(action_frame, text="View User Books", command=self.view_user_books).pack(fill='x', pady=5)
         ttk.Button(action_frame, text="Delete Selected User", command=self.delete_user).pack(fill='x', pady=5)
         ttk.Button(action_frame, text="Refresh List", command=self.refresh_users_list).pack(fill='x', pady=5)
+        ttk.Button(action_frame, text="Import Users...", command=lambda: self.import_data("users")).pack(fill='x', pady=5)
+        ttk.Button(action_frame, text="Export Users...", command=lambda: self.export_data("users")).pack(fill='x', pady=5)
         
         # Load initial data
         self.refresh_users_list()
@@ -446,7 +3264,7 @@ class LibraryManagementSystem:
         user_frame = ttk.LabelFrame(main_frame, text="User Selection")
         user_frame.pack(fill='x', pady=10)
         
-        ttk.Label(user_frame, text="User ID:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        ttk.Label(user_frame, text="User ID or Email:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
         self.checkout_user_id = tk.StringVar()
         ttk.Entry(user_frame, textvariable=self.checkout_user_id).grid(row=0, column=1, padx=5, pady=5, sticky='w')
         ttk.Button(user_frame, text="Find User", command=self.find_user_for_checkout).grid(row=0, column=2, padx=5, pady=5)
@@ -460,11 +3278,15 @@ class LibraryManagementSystem:
         
         ttk.Button(action_frame, text="Checkout Book", command=self.checkout_book).pack(side='left', padx=10)
         ttk.Button(action_frame, text="Return Book", command=self.return_book).pack(side='left', padx=10)
+        ttk.Button(action_frame, text="Import Loans...", command=lambda: self.import_data("loans")).pack(side='left', padx=10)
+        ttk.Button(action_frame, text="Export Loans...", command=lambda: self.export_data("loans")).pack(side='left', padx=10)
         
         # Currently checked out books
         checkout_frame = ttk.LabelFrame(main_frame, text="Currently Checked Out Books")
         checkout_frame.pack(fill='both', expand=True, pady=10)
         
+        TaskStatusBar(checkout_frame, self.tasks, "checkout").frame.pack(fill='x', padx=5)
+        
         self.checkout_tree = ttk.Treeview(checkout_frame, 
                                          columns=("Book ID", "Title", "User", "Due Date"))
         self.checkout_tree.heading("Book ID", text="Book ID")
@@ -480,69 +3302,133 @@ class LibraryManagementSystem:
         
         self.checkout_tree.pack(fill='both', expand=True, padx=5, pady=5)
         
+        scrollbar = ttk.Scrollbar(checkout_frame, orient="vertical")
+        scrollbar.pack(side='right', fill='y')
+        self.checkout_view = VirtualTreeview(self.checkout_tree, scrollbar, lambda loan: loan[0].book_id, loan_row_values)
+        
         # Load initial checkout data
         self.refresh_checkout_list()
     
-    def refresh_books_list(self):
-        # Clear existing items
-        for item in self.book_tree.get_children():
-            self.book_tree.delete(item)
+    def setup_stats_tab(self):
+        main_frame = ttk.Frame(self.stats_tab)
+        main_frame.pack(fill='both', expand=True, padx=10, pady=10)
         
-        # Sort books based on the selected criteria
-        self.sort_books()
+        controls = ttk.Frame(main_frame)
+        controls.pack(fill='x', pady=5)
+        
+        # Timing is off until asked for, the probes cost nothing while disabled
+        self.metrics_enabled = tk.BooleanVar(value=METRICS.enabled)
+        ttk.Checkbutton(controls, text="Record operation timings", variable=self.metrics_enabled,
+                        command=self.toggle_metrics).pack(side='left', padx=5)
+        ttk.Button(controls, text="Refresh", command=self.refresh_stats).pack(side='left', padx=5)
+        ttk.Button(controls, text="Reset Timings", command=self.reset_stats).pack(side='left', padx=5)
+        ttk.Button(controls, text="Dump to File...", command=self.dump_stats).pack(side='left', padx=5)
+        
+        TaskStatusBar(main_frame, self.tasks, "stats").frame.pack(fill='x')
+        
+        # Structure gauges
+        structure_frame = ttk.LabelFrame(main_frame, text="Data Structures")
+        structure_frame.pack(fill='x', pady=10)
+        self.structure_label = ttk.Label(structure_frame, text="", justify='left')
+        self.structure_label.pack(fill='x', padx=5, pady=5)
+        
+        # Operation latencies
+        operations_frame = ttk.LabelFrame(main_frame, text="Operations")
+        operations_frame.pack(fill='both', expand=True, pady=10)
+        
+        self.stats_tree = ttk.Treeview(operations_frame, columns=("Operation", "Count", "Mean", "p50", "p99", "Max"))
+        self.stats_tree.heading("Operation", text="Operation")
+        self.stats_tree.heading("Count", text="Count")
+        self.stats_tree.heading("Mean", text="Mean (us)")
+        self.stats_tree.heading("p50", text="p50 (us)")
+        self.stats_tree.heading("p99", text="p99 (us)")
+        self.stats_tree.heading("Max", text="Max (us)")
+        
+        self.stats_tree.column("#0", width=0, stretch=tk.NO)
+        self.stats_tree.column("Operation", width=150)
+        for column in ("Count", "Mean", "p50", "p99", "Max"):
+            self.stats_tree.column(column, width=80)
+        
+        self.stats_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        scrollbar = ttk.Scrollbar(operations_frame, orient="vertical")
+        scrollbar.pack(side='right', fill='y')
+        self.stats_view = VirtualTreeview(self.stats_tree, scrollbar, lambda row: row[0], tuple)
+    
+    def on_tab_changed(self, event):
+        if self.notebook.select() == str(self.stats_tab):
+            self.refresh_stats()
+    
+    def toggle_metrics(self):
+        if self.metrics_enabled.get():
+            METRICS.enable()
+        else:
+            METRICS.disable()
+        self.refresh_stats()
+    
+    def reset_stats(self):
+        METRICS.reset()
+        self.refresh_stats()
+    
+    def refresh_stats(self):
+        self.tasks.submit("stats", "Collecting stats", lambda progress: dump_metrics(self.core), self.show_stats)
+    
+    def show_stats(self, report):
+        books = report["structures"]["books"]
+        users = report["structures"]["users"]
+        self.structure_label.config(text=(
+            f"Books: {books['books']}, BST height {books['bst_height']}, "
+            f"{books['search_cache_entries']} cached searches\n"
+            f"Users: {users['users']} in {users['table']} of capacity {users['capacity']}, "
+            f"load factor {users['load_factor']:.2f}, max chain {users['max_chain']}, "
+            f"{users['resizes']} resizes\n"
+            f"Loans: {report['structures']['loans']['checked_out']} books checked out"))
+        
+        rows = []
+        for name, summary in report["operations"].items():
+            rows.append((name, summary["count"], f"{summary['mean_us']:.1f}", f"{summary['p50_us']:.0f}",
+                         f"{summary['p99_us']:.0f}", f"{summary['max_us']:.0f}"))
+        self.stats_view.set_rows(rows)
+    
+    def dump_stats(self):
+        path = filedialog.asksaveasfilename(parent=self.root, title="Dump Stats", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        name = os.path.basename(path)
+        self.tasks.submit("stats", f"Writing {name}", lambda progress: dump_metrics(self.core, path),
+                          lambda report: messagebox.showinfo("Stats Written", f"Stats written to {name}."))
+    
+    def refresh_books_list(self):
+        # Keeps the scroll position, only the cells that changed on screen are rewritten
+        sort_by = self.sort_by_var.get()
+        self.tasks.submit("books", "Loading books", lambda progress: self.core.sorted_books(sort_by, progress),
+                          self.book_view.set_rows)
     
     def sort_books(self):
+        # Sort books based on the selected criteria
         sort_by = self.sort_by_var.get()
-        all_books = self.books.get_all_books()
-        
-        if sort_by == "ID":
-            sorted_books = quick_sort_books(all_books, lambda book: book.book_id)
-        elif sort_by == "Title":
-            sorted_books = quick_sort_books(all_books, lambda book: book.title.lower())
-        elif sort_by == "Author":
-            sorted_books = quick_sort_books(all_books, lambda book: book.author.lower())
-        elif sort_by == "Genre":
-            sorted_books = quick_sort_books(all_books, lambda book: book.genre.lower())
-        
-        # Clear existing items
-        for item in self.book_tree.get_children():
-            self.book_tree.delete(item)
-        
-        # Insert sorted books
-        for book in sorted_books:
-            status = "Available" if book.available else "Checked Out"
-            self.book_tree.insert("", "end", values=(book.book_id, book.title, book.author, book.genre, status))
+        self.tasks.submit("books", f"Sorting by {sort_by}", lambda progress: self.core.sorted_books(sort_by, progress),
+                          lambda books: self.book_view.set_rows(books, scroll_to_top=True))
+    
+    def schedule_book_search(self, *args):
+        # O(1) per keystroke, each one supersedes the search still waiting from the last
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(self.SEARCH_DELAY, self.search_books)
     
     def search_books(self):
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
         search_term = self.book_search_var.get().strip()
         if not search_term:
             self.refresh_books_list()
             return
         
-        # Clear existing items
-        for item in self.book_tree.get_children():
-            self.book_tree.delete(item)
-        
-        all_books = self.books.get_all_books()
-        
-        # First try exact ID search
-        try:
-            book_id = int(search_term)
-            book = self.books.search(book_id)
-            if book:
-                status = "Available" if book.available else "Checked Out"
-                self.book_tree.insert("", "end", values=(book.book_id, book.title, book.author, book.genre, status))
-                return
-        except ValueError:
-            pass
-        
-        # Search by title
-        for book in all_books:
-            if (search_term.lower() in book.title.lower() or 
-                search_term.lower() in book.author.lower() or
-                search_term.lower() in book.genre.lower()):
-                status = "Available" if book.available else "Checked Out"
-                self.book_tree.insert("", "end", values=(book.book_id, book.title, book.author, book.genre, status))
+        # Exact ID first, then title, author and genre
+        self.tasks.submit("books", f"Searching for '{search_term}'", lambda progress: self.core.search_books(search_term),
+                          lambda books: self.book_view.set_rows(books, scroll_to_top=True))
     
     def add_book_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -573,26 +3459,12 @@ class LibraryManagementSystem:
         genre_combo.grid(row=2, column=1, padx=5, pady=5, sticky='w')
         
         def add_book():
-            title = title_var.get().strip()
-            author = author_var.get().strip()
-            genre = genre_var.get().strip()
-            
-            if not title or not author or not genre:
-                messagebox.showerror("Error", "All fields are required!", parent=dialog)
-                return
-            
-            # Generate new book ID (max ID + 1)
-            max_id = 0
-            for book in self.books.get_all_books():
-                if book.book_id > max_id:
-                    max_id = book.book_id
-            
-            new_id = max_id + 1
-            
-            # Add book to BST
-            self.books.insert(new_id, title, author, genre)
-            
-            messagebox.showinfo("Success", f"Book '{title}' added successfully!", parent=dialog)
+            title, author, genre = title_var.get(), author_var.get(), genre_var.get()
+            self.tasks.submit(None, "Adding book", lambda progress: self.core.add_book(title, author, genre),
+                              book_added, lambda error: messagebox.showerror("Error", str(error), parent=dialog))
+        
+        def book_added(book):
+            messagebox.showinfo("Success", f"Book '{book.title}' added successfully!", parent=dialog)
             dialog.destroy()
             self.refresh_books_list()
         
@@ -605,46 +3477,47 @@ class LibraryManagementSystem:
         
         selected_item = selected_items[0]
         book_id = int(self.book_tree.item(selected_item, "values")[0])
+        self.tasks.submit(None, "Loading book", lambda progress: self.core.book_loan(book_id), self.show_book_details)
+    
+    def show_book_details(self, result):
+        book, user = result
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Book Details: {book.title}")
+        dialog.geometry("400x300")
+        dialog.transient(self.root)
+        dialog.grab_set()
         
-        book = self.books.search(book_id)
-        if book:
-            dialog = tk.Toplevel(self.root)
-            dialog.title(f"Book Details: {book.title}")
-            dialog.geometry("400x300")
-            dialog.transient(self.root)
-            dialog.grab_set()
-            
-            ttk.Label(dialog, text="Book Details", font=("Arial", 12, "bold")).pack(pady=10)
-            
-            details_frame = ttk.Frame(dialog)
-            details_frame.pack(fill='both', expand=True, padx=20, pady=10)
-            
-            ttk.Label(details_frame, text="ID:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
-            ttk.Label(details_frame, text=book.book_id).grid(row=0, column=1, padx=5, pady=5, sticky='w')
-            
-            ttk.Label(details_frame, text="Title:").grid(row=1, column=0, padx=5, pady=5, sticky='w')
-            ttk.Label(details_frame, text=book.title).grid(row=1, column=1, padx=5, pady=5, sticky='w')
-            
-            ttk.Label(details_frame, text="Author:").grid(row=2, column=0, padx=5, pady=5, sticky='w')
-            ttk.Label(details_frame, text=book.author).grid(row=2, column=1, padx=5, pady=5, sticky='w')
-            
-            ttk.Label(details_frame, text="Genre:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
-            ttk.Label(details_frame, text=book.genre).grid(row=3, column=1, padx=5, pady=5, sticky='w')
-            
-            ttk.Label(details_frame, text="Status:").grid(row=4, column=0, padx=5, pady=5, sticky='w')
-            status = "Available" if book.available else "Checked Out"
-            ttk.Label(details_frame, text=status).grid(row=4, column=1, padx=5, pady=5, sticky='w')
-            
-            if not book.available and book.checkout_user and book.due_date:
-                user = self.users.get(book.checkout_user)
-                if user:
-                    ttk.Label(details_frame, text="Checked out by:").grid(row=5, column=0, padx=5, pady=5, sticky='w')
-                    ttk.Label(details_frame, text=user[1]).grid(row=5, column=1, padx=5, pady=5, sticky='w')
-                
-                ttk.Label(details_frame, text="Due date:").grid(row=6, column=0, padx=5, pady=5, sticky='w')
-                ttk.Label(details_frame, text=book.due_date.strftime("%Y-%m-%d")).grid(row=6, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(dialog, text="Book Details", font=("Arial", 12, "bold")).pack(pady=10)
+        
+        details_frame = ttk.Frame(dialog)
+        details_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        
+        ttk.Label(details_frame, text="ID:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        ttk.Label(details_frame, text=book.book_id).grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Label(details_frame, text="Title:").grid(row=1, column=0, padx=5, pady=5, sticky='w')
+        ttk.Label(details_frame, text=book.title).grid(row=1, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Label(details_frame, text="Author:").grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        ttk.Label(details_frame, text=book.author).grid(row=2, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Label(details_frame, text="Genre:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        ttk.Label(details_frame, text=book.genre).grid(row=3, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Label(details_frame, text="Status:").grid(row=4, column=0, padx=5, pady=5, sticky='w')
+        status = "Available" if book.available else "Checked Out"
+        ttk.Label(details_frame, text=status).grid(row=4, column=1, padx=5, pady=5, sticky='w')
+        
+        due_date = book.due_date  # Read once, a return on another desk may clear it
+        if not book.available and book.checkout_user and due_date:
+            if user:
+                ttk.Label(details_frame, text="Checked out by:").grid(row=5, column=0, padx=5, pady=5, sticky='w')
+                ttk.Label(details_frame, text=user[1]).grid(row=5, column=1, padx=5, pady=5, sticky='w')
             
-            ttk.Button(dialog, text="Close", command=dialog.destroy).pack(pady=10)
+            ttk.Label(details_frame, text="Due date:").grid(row=6, column=0, padx=5, pady=5, sticky='w')
+            ttk.Label(details_frame, text=due_date.strftime("%Y-%m-%d")).grid(row=6, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Button(dialog, text="Close", command=dialog.destroy).pack(pady=10)
     
     def delete_book(self):
         selected_items = self.book_tree.selection()
@@ -654,38 +3527,70 @@ class LibraryManagementSystem:
         
         selected_item = selected_items[0]
         book_id = int(self.book_tree.item(selected_item, "values")[0])
+        self.tasks.submit(None, "Loading book", lambda progress: self.core.book_loan(book_id), self.confirm_delete_book)
+    
+    def confirm_delete_book(self, result):
+        book, user = result
+        if not book.available:
+            messagebox.showerror("Error", "Cannot delete book that is currently checked out!")
+            return
         
-        book = self.books.search(book_id)
-        if book:
-            if not book.available:
-                messagebox.showerror("Error", "Cannot delete book that is currently checked out!")
-                return
-            
-            confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{book.title}'?")
-            if confirm:
-                # For simplicity, we'll just mark it as unavailable
-                book.available = False
-                
-                # Remove it from the books_list for display purposes
-                self.books.books_list = [b for b in self.books.books_list if b.book_id != book_id]
-                
-                messagebox.showinfo("Success", f"Book '{book.title}' deleted successfully!")
-                self.refresh_books_list()
+        confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{book.title}'?")
+        if confirm:
+            self.tasks.submit(None, "Deleting book", lambda progress: self.core.delete_book(book.book_id),
+                              self.book_deleted)
     
-    def refresh_users_list(self):
-        # Clear existing items
-        for item in self.user_tree.get_children():
-            self.user_tree.delete(item)
+    def book_deleted(self, book):
+        messagebox.showinfo("Success", f"Book '{book.title}' deleted successfully!")
+        self.refresh_books_list()
+    
+    def import_data(self, kind):
+        path = filedialog.askopenfilename(parent=self.root, title=f"Import {kind.title()}",
+                                          filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not path:
+            return
         
-        # Get all users
-        all_users = self.users.get_all_users()
+        # Cancelling keeps the chunks already imported, the list is refreshed either way
+        self.tasks.submit(TASK_LANES[kind], f"Importing {os.path.basename(path)}",
+                          lambda progress: self.core.import_file(kind, path, progress),
+                          lambda report: self.import_finished(kind, report),
+                          lambda error: self.import_finished(kind, None, error))
+    
+    def import_finished(self, kind, report, error=None):
+        if isinstance(error, TaskCancelled):
+            # The chunks loaded before cancelling are kept; a newer task in the lane refreshes anyway
+            if self.tasks.busy(TASK_LANES[kind]):
+                return
+        elif report is None:
+            messagebox.showerror("Import Failed", str(error))
+        else:
+            message = f"Imported {report.imported} of {report.rows} rows."
+            if report.error_count:
+                message += f"\n\n{report.error_count} rows were skipped:\n"
+                message += "\n".join(f"Line {line}: {error}" for line, error in report.errors[:10])
+            messagebox.showinfo("Import Finished", message)
         
-        # Sort users by ID
-        all_users.sort(key=lambda user: user[0])
+        if kind == "users":
+            self.refresh_users_list()
+        else:
+            self.refresh_books_list()
+        if kind == "loans":
+            self.refresh_checkout_list()
+    
+    def export_data(self, kind):
+        path = filedialog.asksaveasfilename(parent=self.root, title=f"Export {kind.title()}", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not path:
+            return
         
-        # Insert users into treeview
-        for user_id, name, email in all_users:
-            self.user_tree.insert("", "end", values=(user_id, name, email))
+        name = os.path.basename(path)
+        self.tasks.submit(TASK_LANES[kind], f"Exporting {name}", lambda progress: self.core.export_file(kind, path),
+                          lambda count: messagebox.showinfo("Export Finished", f"Exported {count} {kind} to {name}."))
+    
+    def refresh_users_list(self):
+        # Users sorted by ID
+        self.tasks.submit("users", "Loading users", lambda progress: self.core.sorted_users(progress),
+                          self.user_view.set_rows)
     
     def add_user_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -708,25 +3613,12 @@ class LibraryManagementSystem:
         ttk.Entry(form_frame, textvariable=email_var, width=30).grid(row=1, column=1, padx=5, pady=5, sticky='w')
         
         def add_user():
-            name = name_var.get().strip()
-            email = email_var.get().strip()
-            
-            if not name or not email:
-                messagebox.showerror("Error", "All fields are required!", parent=dialog)
-                return
-            
-            # Generate new user ID (max ID + 1)
-            max_id = 0
-            for user_id, _, _ in self.users.get_all_users():
-                if user_id > max_id:
-                    max_id = user_id
-            
-            new_id = max_id + 1
-            
-            # Add user to hash table
-            self.users.insert(new_id, name, email)
-            
-            messagebox.showinfo("Success", f"User '{name}' added successfully!", parent=dialog)
+            name, email = name_var.get(), email_var.get()
+            self.tasks.submit(None, "Adding user", lambda progress: self.core.add_user(name, email),
+                              user_added, lambda error: messagebox.showerror("Error", str(error), parent=dialog))
+        
+        def user_added(user):
+            messagebox.showinfo("Success", f"User '{user[1]}' added successfully!", parent=dialog)
             dialog.destroy()
             self.refresh_users_list()
         
@@ -740,11 +3632,12 @@ class LibraryManagementSystem:
         
         selected_item = selected_items[0]
         user_id = int(self.user_tree.item(selected_item, "values")[0])
-        
-        user = self.users.get(user_id)
-        if not user:
-            return
-        
+        self.tasks.submit(None, "Loading loans",
+                          lambda progress: (self.core.require_user(user_id), self.core.user_books(user_id)),
+                          self.show_user_books)
+    
+    def show_user_books(self, result):
+        user, books = result
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Books Checked Out by {user[1]}")
         dialog.geometry("600x400")
@@ -767,13 +3660,10 @@ class LibraryManagementSystem:
         tree.pack(fill='both', expand=True, padx=10, pady=10)
         
         # Find books checked out by this user
-        found_books = False
-        for book in self.books.get_all_books():
-            if not book.available and book.checkout_user == user_id:
-                found_books = True
-                tree.insert("", "end", values=(book.book_id, book.title, book.due_date.strftime("%Y-%m-%d")))
+        for book in books:
+            tree.insert("", "end", values=(book.book_id, book.title, book.due_date.strftime("%Y-%m-%d")))
         
-        if not found_books:
+        if not books:
             ttk.Label(dialog, text="No books currently checked out by this user.").pack(pady=10)
         
         ttk.Button(dialog, text="Close", command=dialog.destroy).pack(pady=10)
@@ -786,38 +3676,31 @@ class LibraryManagementSystem:
         
         selected_item = selected_items[0]
         user_id = int(self.user_tree.item(selected_item, "values")[0])
+        self.tasks.submit(None, "Loading user",
+                          lambda progress: (self.core.require_user(user_id), self.core.has_loans(user_id)),
+                          self.confirm_delete_user)
+    
+    def confirm_delete_user(self, result):
+        user, has_loans = result
+        # Check if user has books checked out
+        if has_loans:
+            messagebox.showerror("Error", "Cannot delete user who has books checked out!")
+            return
         
-        user = self.users.get(user_id)
-        if user:
-            # Check if user has books checked out
-            has_books = False
-            for book in self.books.get_all_books():
-                if not book.available and book.checkout_user == user_id:
-                    has_books = True
-                    break
-            
-            if has_books:
-                messagebox.showerror("Error", "Cannot delete user who has books checked out!")
-                return
-            
-            confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete user '{user[1]}'?")
-            if confirm:
-                self.users.remove(user_id)
-                messagebox.showinfo("Success", f"User '{user[1]}' deleted successfully!")
-                self.refresh_users_list()
+        confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete user '{user[1]}'?")
+        if confirm:
+            self.tasks.submit(None, "Deleting user", lambda progress: self.core.delete_user(user[0]),
+                              self.user_deleted)
+    
+    def user_deleted(self, user):
+        messagebox.showinfo("Success", f"User '{user[1]}' deleted successfully!")
+        self.refresh_users_list()
     
     def refresh_checkout_list(self):
-        # Clear existing items
-        for item in self.checkout_tree.get_children():
-            self.checkout_tree.delete(item)
-        
-        # Find checked out books
-        for book in self.books.get_all_books():
-            if not book.available and book.checkout_user:
-                user = self.users.get(book.checkout_user)
-                if user:
-                    due_date = book.due_date.strftime("%Y-%m-%d") if book.due_date else "N/A"
-                    self.checkout_tree.insert("", "end", values=(book.book_id, book.title, user[1], due_date))
+        # Loans whose user still exists, in book ID order
+        self.tasks.submit("checkout", "Loading loans",
+                          lambda progress: [loan for loan in self.core.checked_out_books(progress) if loan[1]],
+                          self.checkout_view.set_rows)
     
     def find_book_for_checkout(self):
         book_id_str = self.checkout_book_id.get().strip()
@@ -827,37 +3710,38 @@ class LibraryManagementSystem:
         
         try:
             book_id = int(book_id_str)
-            book = self.books.search(book_id)
-            
-            if not book:
-                self.book_info_label.config(text="Book not found!")
-                return
-            
-            if not book.available:
-                self.book_info_label.config(text=f"Book '{book.title}' is already checked out!")
-                return
-            
-            self.book_info_label.config(text=f"Selected: {book.title} by {book.author}")
         except ValueError:
             self.book_info_label.config(text="Invalid book ID!")
+            return
+        self.tasks.submit(None, "Finding book", lambda progress: self.core.find_book(book_id),
+                          self.show_checkout_book)
+    
+    def show_checkout_book(self, book):
+        if not book:
+            self.book_info_label.config(text="Book not found!")
+            return
+        
+        if not book.available:
+            self.book_info_label.config(text=f"Book '{book.title}' is already checked out!")
+            return
+        
+        self.book_info_label.config(text=f"Selected: {book.title} by {book.author}")
     
     def find_user_for_checkout(self):
         user_id_str = self.checkout_user_id.get().strip()
         if not user_id_str:
-            self.user_info_label.config(text="Please enter a user ID")
+            self.user_info_label.config(text="Please enter a user ID or email")
             return
         
-        try:
-            user_id = int(user_id_str)
-            user = self.users.get(user_id)
-            
-            if not user:
-                self.user_info_label.config(text="User not found!")
-                return
-            
-            self.user_info_label.config(text=f"Selected: {user[1]} ({user[2]})")
-        except ValueError:
-            self.user_info_label.config(text="Invalid user ID!")
+        self.tasks.submit(None, "Finding user", lambda progress: self.core.find_user(user_id_str),
+                          self.show_checkout_user, lambda error: self.user_info_label.config(text=str(error)))
+    
+    def show_checkout_user(self, user):
+        if not user:
+            self.user_info_label.config(text="User not found!")
+            return
+        
+        self.user_info_label.config(text=f"Selected: {user[1]} ({user[2]})")
     
     def checkout_book(self):
         book_id_str = self.checkout_book_id.get().strip()
@@ -869,37 +3753,24 @@ class LibraryManagementSystem:
         
         try:
             book_id = int(book_id_str)
-            user_id = int(user_id_str)
-            
-            book = self.books.search(book_id)
-            user = self.users.get(user_id)
-            
-            if not book or not user:
-                messagebox.showerror("Error", "Book or user not found!")
-                return
-            
-            if not book.available:
-                messagebox.showerror("Error", "This book is already checked out!")
-                return
-            
-            # Update book status
-            book.available = False
-            book.checkout_user = user_id
-            book.due_date = datetime.datetime.now() + datetime.timedelta(days=14)  # 2 weeks
-            
-            messagebox.showinfo("Success", f"Book '{book.title}' checked out to {user[1]} successfully!\n"
-                                         f"Due date: {book.due_date.strftime('%Y-%m-%d')}")
-            
-            # Clear fields and refresh lists
-            self.checkout_book_id.set("")
-            self.checkout_user_id.set("")
-            self.book_info_label.config(text="No book selected")
-            self.user_info_label.config(text="No user selected")
-            self.refresh_checkout_list()
-            self.refresh_books_list()
-            
         except ValueError:
             messagebox.showerror("Error", "Invalid book ID or user ID!")
+            return
+        self.tasks.submit(None, "Checking out", lambda progress: self.core.checkout(book_id, user_id_str),
+                          self.book_checked_out)
+    
+    def book_checked_out(self, result):
+        book, user = result
+        messagebox.showinfo("Success", f"Book '{book.title}' checked out to {user[1]} successfully!\n"
+                                     f"Due date: {book.due_date.strftime('%Y-%m-%d')}")
+        
+        # Clear fields and refresh lists
+        self.checkout_book_id.set("")
+        self.checkout_user_id.set("")
+        self.book_info_label.config(text="No book selected")
+        self.user_info_label.config(text="No user selected")
+        self.refresh_checkout_list()
+        self.book_view.refresh_row(book.book_id)  # Only its status cell changes
     
     def return_book(self):
         book_id_str = self.checkout_book_id.get().strip()
@@ -910,42 +3781,309 @@ class LibraryManagementSystem:
         
         try:
             book_id = int(book_id_str)
-            book = self.books.search(book_id)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid book ID!")
+            return
+        self.tasks.submit(None, "Returning", lambda progress: self.core.return_book(book_id), self.book_returned)
+    
+    def book_returned(self, result):
+        book, user = result
+        user_name = user[1] if user else "Unknown"
+        
+        messagebox.showinfo("Success", f"Book '{book.title}' returned successfully!"
+                                     f"\nPreviously checked out to: {user_name}")
+        
+        # Clear fields and refresh lists
+        self.checkout_book_id.set("")
+        self.book_info_label.config(text="No book selected")
+        self.refresh_checkout_list()
+        self.book_view.refresh_row(book.book_id)
+
+# Memory measurement mode: python haha.py --measure-memory [num_books]
+def _deep_sizeof(obj, seen):
+    # Bytes reachable from obj that are not already in seen, without recursion
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or obj is None or isinstance(obj, (bool, type)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__slots__"):
+            stack.extend(getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name))
+        elif hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+    return total
+
+def book_memory_report(num_books=100000):
+    # Bytes per book of the nodes and of each index, shared objects are counted once, nodes first
+    books = generate_books(num_books)
+    seen = set()
+    nodes = sum(_deep_sizeof(book, seen) for book in books.books_list)
+    report = {
+        "nodes": nodes,
+        "books_list": _deep_sizeof(books.books_list, seen),
+        "token_index": _deep_sizeof(books.token_index.postings, seen),
+        "trigram_index": _deep_sizeof(books.trigram_index.postings, seen),
+        "sort_indexes": _deep_sizeof(books.sort_indexes, seen),
+    }
+    report["total"] = sum(report.values())
+    return {part: size / num_books for part, size in report.items()}
+
+class _SlowJournal(LibraryStorage):
+    # Stands in for a journal on a slow device; the wait releases the GIL the way real I/O does
+    def __init__(self, directory, latency):
+        super().__init__(directory)
+        self.latency = latency
+    
+    def log(self, op, **fields):
+        time.sleep(self.latency)
+        super().log(op, **fields)
+
+def circulation_stress(num_threads=8, ops_per_thread=500, stripes=64, latency=0.0005, seed=0):
+    # Desks check out and return random books at once, then every book's history is checked:
+    # checkouts minus returns must be 0 or 1 and agree with the book and the LoanIndex
+    with tempfile.TemporaryDirectory() as directory:
+        core = LibraryCore(_SlowJournal(directory, latency))
+        core.book_locks = StripedLocks(stripes)
+        book_ids = [book.book_id for book in core.books.get_all_books()]
+        user_ids = [user[0] for user in core.users.get_all_users()]
+        counts = []
+        
+        def desk(index):
+            rng = random.Random(seed * 1000 + index)
+            checkouts, returns = {}, {}
+            for _ in range(ops_per_thread):
+                book_id = rng.choice(book_ids)
+                try:
+                    core.checkout(book_id, rng.choice(user_ids))
+                    checkouts[book_id] = checkouts.get(book_id, 0) + 1
+                except LibraryError:
+                    try:
+                        core.return_book(book_id)
+                        returns[book_id] = returns.get(book_id, 0) + 1
+                    except LibraryError:
+                        pass  # Another desk got there first
+            counts.append((checkouts, returns))
+        
+        threads = [threading.Thread(target=desk, args=(i,)) for i in range(num_threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        errors = []
+        for book_id in book_ids:
+            out = sum(c.get(book_id, 0) for c, _ in counts) - sum(r.get(book_id, 0) for _, r in counts)
+            book = core.books.search(book_id)
+            on_loan = book_id in core.loans.checked_out
+            if out not in (0, 1) or out != (not book.available) or on_loan != (not book.available):
+                errors.append(book_id)
+        core.close()
+    return {"ops_per_sec": num_threads * ops_per_thread / elapsed, "inconsistent_books": errors}
+
+# Benchmark mode: python haha.py --benchmark [max_size] [--out results.jsonl]
+# One JSON object per line, the first describes the run; compare two runs with
+# python haha.py --benchmark-compare old.jsonl new.jsonl
+BENCHMARK_QUERIES = 1000
+
+def benchmark_records(n, kind, seed=0):
+    # (book_id, title, author, genre) records, not timed
+    # random: shuffled IDs, distinct titles, 10 genres
+    # adversarial: ascending IDs (the worst case for an unbalanced BST) and few distinct
+    # titles, authors and genres, so sort and search keys are mostly duplicates
+    rng = random.Random(seed)
+    if kind == "random":
+        ids = list(range(1, n + 1))
+        rng.shuffle(ids)
+        genres = ["Fiction", "Science Fiction", "Mystery", "Romance", "Fantasy",
+                  "Biography", "History", "Self-Help", "Technology", "Philosophy"]
+        return [(book_id, "".join(rng.choice(string.ascii_lowercase) for _ in range(10)),
+                 f"Author {rng.randrange(1000)}", rng.choice(genres)) for book_id in ids]
+    titles = ["The Hobbit", "Dune", "Emma", "Beloved", "Matilda"]
+    return [(book_id, titles[book_id % len(titles)], "Anonymous", "Fiction") for book_id in range(1, n + 1)]
+
+def _timed(run, repeats):
+    # Median of the seconds returned by repeats calls of run()
+    times = []
+    for _ in range(repeats):
+        times.append(run())
+    times.sort()
+    return times[len(times) // 2]
+
+def _stopwatch(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def run_benchmarks(sizes=(1000, 10000, 100000), repeats=3, seed=0):
+    # Yields one result dict per (operation, input, size)
+    for n in sizes:
+        runs = repeats if n <= 100000 else 1
+        for kind in ("random", "adversarial"):
+            records = benchmark_records(n, kind, seed)
+            rng = random.Random(seed + n)
             
-            if not book:
-                messagebox.showerror("Error", "Book not found!")
-                return
+            def result(name, ops, seconds):
+                return {"name": name, "input": kind, "n": n, "ops": ops, "seconds": seconds,
+                        "ns_per_op": seconds / max(ops, 1) * 1e9}
             
-            if book.available:
-                messagebox.showerror("Error", "This book is not checked out!")
-                return
+            # BookBST, insert one by one in the input order
+            trees = []
+            def insert_all():
+                books = BookBST()
+                start = time.perf_counter()
+                for record in records:
+                    books.insert(*record)
+                elapsed = time.perf_counter() - start
+                trees.append(books)
+                return elapsed
+            yield result("bst.insert", n, _timed(insert_all, runs))
+            books = trees[-1]
+            del trees[:-1]
             
-            user = self.users.get(book.checkout_user)
-            user_name = user[1] if user else "Unknown"
+            lookups = [rng.randint(1, n) for _ in range(BENCHMARK_QUERIES)]
+            misses = [n + 1 + i for i in range(BENCHMARK_QUERIES)]
+            yield result("bst.search", len(lookups),
+                         _timed(lambda: _stopwatch(lambda: [books.search(i) for i in lookups]), runs))
+            yield result("bst.search_miss", len(misses),
+                         _timed(lambda: _stopwatch(lambda: [books.search(i) for i in misses]), runs))
             
-            # Update book status
-            book.available = True
-            book.checkout_user = None
-            book.due_date = None
+            titles = [records[rng.randrange(n)][1] for _ in range(min(BENCHMARK_QUERIES, 100))]
+            yield result("bst.search_by_title", len(titles),
+                         _timed(lambda: _stopwatch(lambda: [books.search_by_title(t) for t in titles]), runs))
             
-            messagebox.showinfo("Success", f"Book '{book.title}' returned successfully!"
-                                         f"\nPreviously checked out to: {user_name}")
+            # quick_sort_books and binary_search_books on the catalog in insertion order
+            nodes = [books.search(record[0]) for record in records]
+            sorted_by_genre = []
+            def sort_by_genre():
+                start = time.perf_counter()
+                sorted_by_genre[:] = quick_sort_books(nodes, lambda book: book.genre)
+                return time.perf_counter() - start
+            yield result("quick_sort_books.genre", n, _timed(sort_by_genre, runs))
             
-            # Clear fields and refresh lists
-            self.checkout_book_id.set("")
-            self.book_info_label.config(text="No book selected")
-            self.refresh_checkout_list()
-            self.refresh_books_list()
+            sorted_by_title = quick_sort_books(nodes, lambda book: book.title)
+            yield result("quick_sort_books.sorted_input", n,
+                         _timed(lambda: _stopwatch(quick_sort_books, sorted_by_title, lambda book: book.title), runs))
+            yield result("binary_search_books.title", len(titles),
+                         _timed(lambda: _stopwatch(lambda: [binary_search_books(sorted_by_title, t, lambda book: book.title)
+                                                            for t in titles]), runs))
+            del books, nodes, sorted_by_genre, sorted_by_title
             
-        except ValueError:
-            messagebox.showerror("Error", "Invalid book ID!")
+            # Both user tables, starting small so the inserts pay for every resize
+            user_ids = [record[0] for record in records]
+            for prefix, table_class in (("users", UserHashTable), ("open_users", OpenUserHashTable)):
+                tables = []
+                def insert_users():
+                    users = table_class()
+                    start = time.perf_counter()
+                    for user_id in user_ids:
+                        users.insert(user_id, f"User {user_id}", f"user{user_id}@example.com")
+                    elapsed = time.perf_counter() - start
+                    tables.append(users)
+                    return elapsed
+                yield result(f"{prefix}.insert", n, _timed(insert_users, runs))
+                users = tables[-1]
+                del tables[:]
+                
+                yield result(f"{prefix}.get", len(lookups),
+                             _timed(lambda: _stopwatch(lambda: [users.get(i) for i in lookups]), runs))
+                yield result(f"{prefix}.get_miss", len(misses),
+                             _timed(lambda: _stopwatch(lambda: [users.get(i) for i in misses]), runs))
+                # Once only, a second run would start from the already doubled table
+                yield result(f"{prefix}.resize", n, _stopwatch(_full_resize, users))
+                del users
+
+def _full_resize(users):
+    # Doubles a user table and moves every entry, OpenUserHashTable would otherwise spread
+    # the moves over later inserts and removes
+    users._resize(users.size * 2)
+    if isinstance(users, OpenUserHashTable):
+        users._migrate(len(users.old[0]))
+
+def benchmark_environment(sizes, repeats, seed):
+    return {"name": "environment", "python": sys.version.split()[0], "platform": sys.platform,
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "sizes": list(sizes), "repeats": repeats, "seed": seed}
+
+def compare_benchmarks(old_path, new_path):
+    # (name, input, n, old ns/op, new ns/op, new / old) for every measurement in both files
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return {(row["name"], row["input"], row["n"]): row["ns_per_op"] for row in rows if row["name"] != "environment"}
+    
+    old, new = load(old_path), load(new_path)
+    return [key + (old[key], new[key], new[key] / old[key]) for key in old if key in new]
 
 def main():
+    if "--metrics" in sys.argv:
+        # Record operation timings from the start, otherwise they are turned on from the Stats tab
+        METRICS.enable()
+    
+    if "--serve" in sys.argv:
+        # Headless: the same core behind the HTTP/JSON API, no Tk needed
+        args = sys.argv[sys.argv.index("--serve") + 1:]
+        port = int(args[0]) if args else 8080
+        print(f"Serving the library API on http://127.0.0.1:{port}")
+        try:
+            asyncio.run(LibraryServer(LibraryCore(), port=port).serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return
+    
+    if "--measure-memory" in sys.argv:
+        args = sys.argv[sys.argv.index("--measure-memory") + 1:]
+        num_books = int(args[0]) if args else 100000
+        for part, size in book_memory_report(num_books).items():
+            print(f"{part:>14}: {size:8.1f} bytes/book")
+        return
+    
+    if "--benchmark" in sys.argv:
+        args = sys.argv[sys.argv.index("--benchmark") + 1:]
+        max_size = int(args[0]) if args and args[0].isdigit() else 100000
+        sizes = [10 ** exponent for exponent in range(3, 7) if 10 ** exponent <= max_size]
+        out_path = args[args.index("--out") + 1] if "--out" in args else None
+        out = open(out_path, "w", encoding="utf-8") if out_path else sys.stdout
+        try:
+            print(json.dumps(benchmark_environment(sizes, 3, 0)), file=out, flush=True)
+            for row in run_benchmarks(sizes):
+                print(json.dumps(row), file=out, flush=True)
+                if out_path:
+                    print(f"{row['name']:>30} {row['input']:>11} n={row['n']:<8} {row['ns_per_op']:12.0f} ns/op")
+        finally:
+            if out_path:
+                out.close()
+        return
+    
+    if "--benchmark-compare" in sys.argv:
+        old_path, new_path = sys.argv[sys.argv.index("--benchmark-compare") + 1:][:2]
+        for name, kind, n, old, new, ratio in compare_benchmarks(old_path, new_path):
+            print(f"{name:>30} {kind:>11} n={n:<8} {old:12.0f} -> {new:12.0f} ns/op  x{ratio:.2f}")
+        return
+    
+    if "--stress-circulation" in sys.argv:
+        # Striped locks against a single lock, same workload, more desks each row
+        for num_threads in (1, 2, 4, 8, 16):
+            row = [f"{num_threads:>2} threads"]
+            for stripes in (1, 64):
+                result = circulation_stress(num_threads, stripes=stripes)
+                row.append(f"{stripes:>2} stripes {result['ops_per_sec']:8.0f} ops/s, "
+                           f"{len(result['inconsistent_books'])} inconsistent")
+            print(" | ".join(row))
+        return
+    
     root = tk.Tk()
     app = LibraryManagementSystem(root)
     root.mainloop()
 
 if __name__ == "__main__":
     main()
-
-lms = LibraryManagementSystem()
\ No newline at end of file